@@ -0,0 +1,491 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Terrance Williams
+@description:
+    Benchmarks for uav_follower.kmeans. Requires the uav_follower package to be
+    importable (source the catkin workspace first).
+
+    Benchmarks:
+        assign: Nested-loop label assignment (the original algorithm) vs. the
+            vectorized N x K distance-matrix assignment.
+        accel: Full clustering runs with the 'lloyd', 'hamerly', and 'elkan'
+            algorithms on blob data (use a larger -k, ex. -k 32).
+        batch: One KMeans per detection batch vs. a single cluster_batch
+            call (-n sets the number of batches, -k the max boxes per frame).
+        kdtree: Brute-force ('lloyd') vs. kd-tree filtering ('kdtree')
+            assignment on blob data for each size and each of --dims. The
+            tree build is timed separately, since it is paid once per data
+            set.
+        threads: Clustering with the chunked assignment on 1 to 4 threads
+            (set with --threads), checking that the labels do not change.
+        suite: Reproducible workloads timed end to end (`cluster()`) and per
+            phase (construction, initialization, assignment, centroid
+            update):
+                detections: ss02-shaped batches of 7 frames x M boxes
+                    (--boxes) around a few targets plus outliers, clustered
+                    as in ss03 (k = most boxes in a frame, initial means
+                    from that frame).
+                image: Image-like colour data of -n pixels (few distinct
+                    colours, smooth regions, sensor noise) for each --ks.
+                blobs: Every combination of -n, --ks, and --dims.
+            Results are printed and, with --output, written as JSON
+            (.json) or CSV (.csv) for comparison between runs.
+"""
+
+import argparse
+import csv
+import json
+import platform
+import time
+import numpy as np
+from uav_follower.kmeans import KMeans, cluster_batch, _KDTree
+
+
+#%% Set up CL-args
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    'benchmark',
+    choices=['assign', 'accel', 'batch', 'kdtree', 'threads', 'suite'],
+    help="Which benchmark to run."
+)
+parser.add_argument(
+    '-n', '--sizes',
+    type=int,
+    nargs='+',
+    default=[500, 1000, 2000, 4000],
+    help="Number of data points to benchmark with."
+)
+parser.add_argument(
+    '-k', '--segments',
+    type=int,
+    default=7,
+    help="Number of clusters."
+)
+parser.add_argument(
+    '-d', '--ndim',
+    type=int,
+    default=4,
+    help="Dimension of each data point."
+)
+parser.add_argument(
+    '--dims',
+    type=int,
+    nargs='+',
+    default=[2, 4, 8],
+    help="Data dimensions to sweep (kdtree benchmark)."
+)
+parser.add_argument(
+    '--threads',
+    type=int,
+    nargs='+',
+    default=[1, 2, 3, 4],
+    help="Thread counts to sweep (threads benchmark)."
+)
+parser.add_argument(
+    '--ks',
+    type=int,
+    nargs='+',
+    default=[4, 8, 16],
+    help="Numbers of clusters to sweep (suite benchmark)."
+)
+parser.add_argument(
+    '--boxes',
+    type=int,
+    nargs='+',
+    default=[5, 20, 80],
+    help="Boxes per frame to sweep (suite benchmark)."
+)
+parser.add_argument(
+    '--algorithms',
+    nargs='+',
+    default=['lloyd'],
+    help="KMeans algorithms to run (suite benchmark)."
+)
+parser.add_argument(
+    '-o', '--output',
+    default=None,
+    help="Write suite results to this .json or .csv file."
+)
+parser.add_argument(
+    '-r', '--repeats',
+    type=int,
+    default=3,
+    help="Timing repetitions; the best time is reported."
+)
+parser.add_argument(
+    '--seed',
+    type=int,
+    default=0,
+    help="Seed for the synthetic data."
+)
+
+
+#%% Helpers
+def best_time(func, repeats: int) -> float:
+    """Return the shortest wall time (s) of `repeats` calls to `func`."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def make_blobs(size: int, segments: int, ndim: int, rng) -> np.ndarray:
+    """`size` points scattered around `segments` random centres."""
+    centres = rng.random_sample((segments, ndim)) * 10
+    labels = rng.randint(segments, size=size)
+    return centres[labels] + rng.normal(scale=0.5, size=(size, ndim))
+
+
+def make_detection_batch(max_boxes: int, rng, frames: int = 7) -> tuple:
+    """
+    A batch shaped like ss02 output: `frames` frames of 1 to `max_boxes`
+    normalized xyxy boxes. Returns the flattened boxes and the frame with
+    the most boxes (ss03's initial means).
+    """
+    batch = [
+        rng.random_sample((rng.randint(1, max_boxes + 1), 4)).astype(np.float32)
+        for _ in range(frames)
+    ]
+    return np.concatenate(batch), max(batch, key=len)
+
+
+def make_ss02_batch(
+        boxes: int,
+        rng,
+        frames: int = 7,
+        targets: int = 3,
+        outlier_ratio: float = 0.2
+) -> np.ndarray:
+    """
+    Detections as ss02 publishes them: `frames` arrays of up to `boxes`
+    (x1, y1, x2, y2, conf, class) rows in normalized coordinates. Most boxes
+    jitter around one of `targets` fixed boxes; `outlier_ratio` of them are
+    random false positives.
+    """
+    centres = 0.15 + 0.7 * rng.random_sample((targets, 2))
+    sizes = 0.05 + 0.1 * rng.random_sample((targets, 2))
+    batch = []
+    for _ in range(frames):
+        count = rng.randint(max(1, boxes // 2), boxes + 1)
+        which = rng.randint(targets, size=count)
+        centre = centres[which] + rng.normal(scale=0.01, size=(count, 2))
+        size = sizes[which] * (1 + rng.normal(scale=0.05, size=(count, 2)))
+        outliers = rng.random_sample(count) < outlier_ratio
+        centre[outliers] = rng.random_sample((outliers.sum(), 2))
+        size[outliers] = 0.02 + 0.2 * rng.random_sample((outliers.sum(), 2))
+        xyxy = np.clip(
+            np.hstack((centre - size / 2, centre + size / 2)), 0, 1
+        )
+        conf = 0.35 + 0.65 * rng.random_sample((count, 1))
+        batch.append(
+            np.hstack((xyxy, conf, np.zeros((count, 1)))).astype(np.float32)
+        )
+    return batch
+
+
+def make_image_pixels(size: int, rng, colours: int = 12) -> np.ndarray:
+    """
+    (size, 3) uint8 RGB pixels of an image-like scene: a few base colours in
+    contiguous regions with smooth shading and sensor noise.
+    """
+    palette = rng.randint(0, 256, size=(colours, 3))
+    region = np.sort(rng.randint(colours, size=size))
+    shading = np.sin(np.linspace(0, 6 * np.pi, size))[:, np.newaxis] * 12
+    noise = rng.normal(scale=4, size=(size, 3))
+    return np.clip(palette[region] + shading + noise, 0, 255).astype(np.uint8)
+
+
+class PhaseTimer:
+    """Accumulates wall time per phase of timed callables."""
+
+    def __init__(self):
+        self.times = {}
+
+    def wrap(self, phase: str, func):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.times[phase] = self.times.get(phase, 0.0) \
+                    + time.perf_counter() - start
+        return timed
+
+
+class TimedEngine:
+    """Assignment engine wrapper that times its calls as the 'assign' phase."""
+
+    def __init__(self, engine, timer: PhaseTimer):
+        self.engine = engine
+        self.call = timer.wrap('assign', engine)
+
+    def __call__(self, means):
+        return self.call(means)
+
+    @property
+    def distance_count(self):
+        return self.engine.distance_count
+
+
+def time_phases(data, repeats: int, **kwargs) -> dict:
+    """
+    Time one KMeans workload: the best end-to-end time (construction and
+    `cluster()`; every run starts from the same seed) and the per-phase
+    times of one instrumented run.
+    """
+    t_cluster = best_time(lambda: KMeans(data, **kwargs).cluster(), repeats)
+
+    timer = PhaseTimer()
+    kmeans = timer.wrap('construct', KMeans)(data, **kwargs)
+    kmeans._initialMeans = timer.wrap('init', kmeans._initialMeans)
+    kmeans._findCentroids = timer.wrap('update', kmeans._findCentroids)
+    make_assigner = kmeans._assigner
+    kmeans._assigner = lambda points: TimedEngine(make_assigner(points), timer)
+    result = kmeans.cluster()
+    phases = timer.times
+    return {
+        'cluster_s': t_cluster,
+        'construct_s': phases.get('construct', 0.0),
+        'init_s': phases.get('init', 0.0),
+        'assign_s': phases.get('assign', 0.0),
+        'update_s': phases.get('update', 0.0),
+        'iterations': result.iterations,
+        'inertia': result.inertia,
+        'distance_count': result.distance_count,
+    }
+
+
+def calc_distance(point1: np.ndarray, point2: np.ndarray) -> np.float64:
+    """The original per-pair distance (the removed KMeans._calcDistance)."""
+    # Cast as numpy arrays to prevent overflow
+    point1 = point1.astype(np.float64)
+    point2 = point2.astype(np.float64)
+    return np.linalg.norm(point1 - point2)
+
+
+def loop_labels(means: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """The original point-by-point, mean-by-mean label assignment."""
+    labels = np.empty(len(points), dtype=np.intp)
+    for n, point in enumerate(points):
+        curr_dist = 1E1000
+        for i in range(len(means)):
+            new_dist = calc_distance(point, means[i])
+            if new_dist < curr_dist:
+                (curr_dist, labels[n]) = (new_dist, i)
+    return labels
+
+
+def bench_assign(args):
+    rng = np.random.RandomState(args.seed)
+    print(f"{'N':>8} {'loop (s)':>12} {'vectorized (s)':>16} {'speedup':>9}")
+    for size in args.sizes:
+        data = rng.random_sample((size, args.ndim))
+        means = data[rng.choice(size, args.segments, replace=False)]
+        kmeans = KMeans(data, segments=args.segments, initial_means=means)
+        points = kmeans._asPoints(data, kmeans.ndim)
+
+        assert np.array_equal(
+            loop_labels(means, points),
+            kmeans._labelPoints(means, points)
+        ), "Vectorized labels differ from the loop labels."
+
+        t_loop = best_time(lambda: loop_labels(means, points), args.repeats)
+        t_vec = best_time(
+            lambda: kmeans._labelPoints(means, points),
+            args.repeats
+        )
+        print(f"{size:>8} {t_loop:>12.5f} {t_vec:>16.6f} {t_loop/t_vec:>8.1f}x")
+
+
+def bench_accel(args):
+    rng = np.random.RandomState(args.seed)
+    algorithms = ['lloyd', 'hamerly', 'elkan']
+    print(f"{'N':>8} {'algorithm':>10} {'iters':>6} {'distances':>12} "
+          f"{'time (s)':>10} {'speedup':>8}")
+    for size in args.sizes:
+        data = make_blobs(size, args.segments, args.ndim, rng)
+        results, times = {}, {}
+        for algorithm in algorithms:
+            def run():
+                results[algorithm] = KMeans(
+                    data,
+                    segments=args.segments,
+                    threshold=1e-3,
+                    seed=args.seed,
+                    algorithm=algorithm
+                ).cluster()
+            times[algorithm] = best_time(run, args.repeats)
+        for algorithm in algorithms:
+            result = results[algorithm]
+            assert np.array_equal(result.labels, results['lloyd'].labels), \
+                f"'{algorithm}' labels differ from 'lloyd' labels."
+            print(f"{size:>8} {algorithm:>10} {result.iterations:>6} "
+                  f"{result.distance_count:>12} {times[algorithm]:>10.4f} "
+                  f"{times['lloyd']/times[algorithm]:>7.1f}x")
+
+
+def bench_batch(args):
+    rng = np.random.RandomState(args.seed)
+    print(f"{'batches':>8} {'loop (s)':>10} {'batched (s)':>12} {'speedup':>8}")
+    for size in args.sizes:
+        batches = [make_detection_batch(args.segments, rng) for _ in range(size)]
+        data = np.concatenate([flat for flat, _ in batches])
+        offsets = np.cumsum([0] + [len(flat) for flat, _ in batches])
+        means = [init for _, init in batches]
+
+        def loop():
+            return [
+                KMeans(
+                    flat, initial_means=init, segments=len(init),
+                    threshold=0.05
+                ).cluster()
+                for flat, init in batches
+            ]
+
+        def batched():
+            return cluster_batch(data, offsets, means, threshold=0.05)
+
+        for single, combined in zip(loop(), batched()):
+            assert np.array_equal(single.labels, combined.labels), \
+                "Batched labels differ from the per-batch labels."
+        t_loop = best_time(loop, args.repeats)
+        t_batch = best_time(batched, args.repeats)
+        print(f"{size:>8} {t_loop:>10.4f} {t_batch:>12.4f} "
+              f"{t_loop/t_batch:>7.1f}x")
+
+
+def bench_kdtree(args):
+    rng = np.random.RandomState(args.seed)
+    print(f"{'N':>8} {'ndim':>5} {'build (s)':>10} {'lloyd (s)':>10} "
+          f"{'kdtree (s)':>11} {'distances':>18} {'winner':>7}")
+    for size in args.sizes:
+        for ndim in args.dims:
+            data = make_blobs(size, args.segments, ndim, rng).astype(np.float32)
+            results, times = {}, {}
+            for algorithm in ('lloyd', 'kdtree'):
+                kmeans = KMeans.from_array(
+                    data, segments=args.segments, threshold=1e-3,
+                    seed=args.seed, algorithm=algorithm
+                )
+                kmeans.cluster()  # builds (and caches) the kd-tree
+
+                def run():
+                    results[algorithm] = kmeans.cluster()
+                times[algorithm] = best_time(run, args.repeats)
+            assert np.array_equal(
+                results['kdtree'].labels, results['lloyd'].labels
+            ), "'kdtree' labels differ from 'lloyd' labels."
+            t_build = best_time(lambda: _KDTree(data), args.repeats)
+            winner = min(times, key=times.get)
+            distances = (f"{results['lloyd'].distance_count:.1e}/"
+                         f"{results['kdtree'].distance_count:.1e}")
+            print(f"{size:>8} {ndim:>5} {t_build:>10.4f} {times['lloyd']:>10.4f} "
+                  f"{times['kdtree']:>11.4f} {distances:>18} {winner:>7}")
+
+
+def bench_threads(args):
+    rng = np.random.RandomState(args.seed)
+    print(f"{'N':>9} {'threads':>8} {'time (s)':>10} {'speedup':>8}")
+    for size in args.sizes:
+        data = make_blobs(size, args.segments, args.ndim, rng).astype(np.float32)
+        results, times = {}, {}
+        for n_threads in args.threads:
+            kmeans = KMeans.from_array(
+                data, segments=args.segments, threshold=1e-3, seed=args.seed,
+                n_threads=n_threads
+            )
+
+            def run():
+                results[n_threads] = kmeans.cluster()
+            times[n_threads] = best_time(run, args.repeats)
+        base = args.threads[0]
+        for n_threads in args.threads:
+            assert np.array_equal(
+                results[n_threads].labels, results[base].labels
+            ), f"Labels differ with {n_threads} threads."
+            print(f"{size:>9} {n_threads:>8} {times[n_threads]:>10.4f} "
+                  f"{times[base]/times[n_threads]:>7.2f}x")
+
+
+def suite_workloads(args):
+    """Yield (workload description, data, KMeans keyword arguments)."""
+    rng = np.random.RandomState(args.seed)
+    for boxes in args.boxes:
+        batch = make_ss02_batch(boxes, rng)
+        means = max(batch, key=len)[:, :4]
+        data = np.concatenate(batch)[:, :4]
+        yield ({'workload': 'detections', 'n': len(data), 'k': len(means),
+                'ndim': 4},
+               data, {'initial_means': means, 'segments': len(means),
+                      'threshold': 0.05})
+    for size in args.sizes:
+        pixels = make_image_pixels(size, rng)
+        for k in args.ks:
+            yield ({'workload': 'image', 'n': size, 'k': k, 'ndim': 3},
+                   pixels, {'segments': k, 'seed': args.seed})
+    for size in args.sizes:
+        for k in args.ks:
+            for ndim in args.dims:
+                data = make_blobs(size, k, ndim, rng).astype(np.float32)
+                yield ({'workload': 'blobs', 'n': size, 'k': k, 'ndim': ndim},
+                       data, {'segments': k, 'seed': args.seed,
+                              'threshold': 1e-3})
+
+
+def bench_suite(args):
+    fields = ['workload', 'n', 'k', 'ndim', 'algorithm', 'cluster_s',
+              'construct_s', 'init_s', 'assign_s', 'update_s', 'iterations',
+              'inertia', 'distance_count']
+    print(f"{'workload':>10} {'N':>8} {'k':>4} {'ndim':>4} {'algorithm':>9} "
+          f"{'cluster':>9} {'construct':>9} {'init':>9} {'assign':>9} "
+          f"{'update':>9} {'iters':>5}")
+    records = []
+    for workload, data, kwargs in suite_workloads(args):
+        for algorithm in args.algorithms:
+            record = dict(workload, algorithm=algorithm)
+            record.update(time_phases(
+                data, args.repeats, algorithm=algorithm, **kwargs
+            ))
+            records.append(record)
+            print(f"{record['workload']:>10} {record['n']:>8} {record['k']:>4} "
+                  f"{record['ndim']:>4} {algorithm:>9} "
+                  + " ".join(f"{record[field]:>9.5f}" for field in fields[5:10])
+                  + f" {record['iterations']:>5}")
+
+    if args.output is None:
+        return
+    if args.output.endswith('.csv'):
+        with open(args.output, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(records)
+    else:
+        meta = {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'seed': args.seed,
+            'repeats': args.repeats,
+        }
+        with open(args.output, 'w') as file:
+            json.dump({'meta': meta, 'results': records}, file, indent=2)
+    print(f"Results written to {args.output}.")
+
+
+BENCHMARKS = {
+    'assign': bench_assign,
+    'accel': bench_accel,
+    'batch': bench_batch,
+    'kdtree': bench_kdtree,
+    'threads': bench_threads,
+    'suite': bench_suite,
+}
+
+
+#%% MAIN Program
+if __name__ == '__main__':
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
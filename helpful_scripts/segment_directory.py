@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Terrance Williams
+@description:
+    Segment a directory of saved frames (ex. background captures from
+    savebackground.py or dataset images from codrone_dataset_gen.py) with
+    uav_follower.kmeans_debug across a process pool. Requires the
+    uav_follower package to be importable (source the catkin workspace
+    first).
+
+    Each image gets a label image and palette (--output labels) or a
+    segmented image (--output segmented) in the output directory, written
+    as soon as it is done. Images that already have their outputs are
+    skipped, so an interrupted run can simply be restarted. Throughput is
+    reported per worker process at the end.
+"""
+
+from pathlib import Path
+import argparse
+import time
+from uav_follower.kmeans_debug import (
+    SEGMENT_OUTPUTS, segment_directory, worker_throughput
+)
+
+
+#%% Set up CL-args
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    'source',
+    help="Directory of images to segment."
+)
+parser.add_argument(
+    '-o', '--outpath',
+    default=None,
+    help=("Output directory. Creates directory if it doesn't exist. "
+          "Default: <source>_segmented")
+)
+parser.add_argument(
+    '-k', '--segments',
+    type=int,
+    default=7,
+    help="Number of clusters per image."
+)
+parser.add_argument(
+    '--output',
+    choices=SEGMENT_OUTPUTS,
+    default='labels',
+    help="Write label images and palettes, or segmented images."
+)
+parser.add_argument(
+    '-p', '--processes',
+    type=int,
+    default=None,
+    help="Worker processes. Default: number of CPUs."
+)
+parser.add_argument(
+    '--levels',
+    type=int,
+    default=1,
+    help="Pyramid levels (see kmeans_debug.segment_pyramid); 1 clusters "
+         "each full image."
+)
+parser.add_argument(
+    '--seed',
+    type=int,
+    default=None,
+    help="Random seed for the initial means."
+)
+parser.add_argument(
+    '--overwrite',
+    action='store_true',
+    help="Re-segment images that were already processed."
+)
+
+
+#%% MAIN Program
+if __name__ == '__main__':
+    args = parser.parse_args()
+    source = Path(args.source).resolve()
+    outpath = Path(args.outpath or f'{source}_segmented').resolve()
+
+    records = []
+    skipped = 0
+    start = time.perf_counter()
+    for record in segment_directory(
+            source, outpath,
+            segments=args.segments,
+            output=args.output,
+            processes=args.processes,
+            skip_existing=not args.overwrite,
+            levels=args.levels,
+            seed=args.seed):
+        records.append(record)
+        if record.outputs:
+            print(f'{record.source.name}: {record.seconds:.2f} s, '
+                  f'{record.iterations} iterations (worker {record.worker})')
+        else:
+            skipped += 1
+    elapsed = time.perf_counter() - start
+
+    #%% Throughput
+    done = len(records) - skipped
+    print(f'\n{done} images segmented, {skipped} skipped, '
+          f'in {elapsed:.2f} s ({done / elapsed:.2f} images/s)')
+    for worker, stats in sorted(worker_throughput(records).items()):
+        print(f"worker {worker}: {stats['images']} images, "
+              f"{stats['images_per_s']:.2f} images/s, "
+              f"{stats['mpixels_per_s']:.2f} Mpx/s")
@@ -7,6 +7,7 @@
 of ROSNumpy-type messages.
 """
 
+from collections import Counter
 from typing import List
 import numpy as np
 from rosnp_msgs.msg import (
@@ -15,7 +16,8 @@ from rosnp_msgs.msg import (
         ROSNumpy_Float32, ROSNumpy_Float64, ROSNumpyList_Int8,
         ROSNumpyList_Int16, ROSNumpyList_Int32, ROSNumpyList_Int64,
         ROSNumpyList_UInt8, ROSNumpyList_UInt16, ROSNumpyList_UInt32,
-        ROSNumpyList_UInt64, ROSNumpyList_Float32, ROSNumpyList_Float64
+        ROSNumpyList_UInt64, ROSNumpyList_Float32, ROSNumpyList_Float64,
+        ROSNumpy, ROSNumpyList
 )
 
 
@@ -42,18 +44,55 @@ rosnp_list_dict = {
     ROSNumpy_UInt32: ROSNumpyList_UInt32,
     ROSNumpy_UInt64: ROSNumpyList_UInt64,
     ROSNumpy_Float32: ROSNumpyList_Float32,
-    ROSNumpy_Float64: ROSNumpyList_Float64
+    ROSNumpy_Float64: ROSNumpyList_Float64,
+    ROSNumpy: ROSNumpyList
 }
 
+# Byte order of the ROSNumpy (raw) message payload.
+RAW_BYTEORDER = '<'
+# dtype kinds the raw message can carry: bool, (u)int, float, complex
+RAW_KINDS = 'biufc'
 
-def encode_rosnp(array: np.ndarray):
+# Debugging aid: set to a collections.Counter (see count_copies) to count
+# the array copies encode_rosnp makes, keyed by reason:
+#   'contiguous': the array was not C-contiguous and was flattened.
+#   'byteorder': the array was converted to native/little-endian order.
+#   'bytes': the data was copied into the bytes object of a uint8 or raw
+#       message (genpy only serializes uint8[] fields from bytes).
+copy_counter = None
+
+
+def count_copies() -> Counter:
+    """Start (or restart) counting encode_rosnp copies; return the counter."""
+    global copy_counter
+    copy_counter = Counter()
+    return copy_counter
+
+
+def _count_copy(reason: str):
+    if copy_counter is not None:
+        copy_counter[reason] += 1
+
+
+def encode_rosnp(array: np.ndarray, raw: bool = False):
     """
     Construct a ROSNumpy-typed message from a provided ndarray.
     Because Numpy arrays are contiguous in memory, we can flatten the array
     and reconstruct it if we know both the shape and dtype.
 
+    The array is only copied when necessary: C-contiguous, native-order
+    arrays are sent through a memoryview of the array itself (genpy reads
+    the elements from it during publish, so don't modify the array before
+    publishing). uint8 and raw messages need one copy into bytes, made
+    straight from the array even if it is a strided view (ex. a BGR -> RGB
+    flip). See copy_counter to count the copies.
+
     Parameter(s):
     array: np.ndarray
+    raw: bool, optional
+        Build a ROSNumpy message (the array's little-endian bytes, any
+        numeric dtype) instead of the dtype-specific message. Raw messages
+        decode without a per-element conversion.
 
     Output(s):
     msg
@@ -63,15 +102,26 @@ def encode_rosnp(array: np.ndarray):
 
     if not isinstance(array, np.ndarray):
         raise ValueError(f"<{func_name}> Input is not a Numpy array.")
+    if raw:
+        return _encode_raw(array)
     
     shape = array.shape
     dtype = array.dtype.name
-    rosnp = array.flatten()
     # correct ROS' uint8[] -> bytes serialization 
     # All other numeric-typed arrays
     # are serialized as tuples.
     if dtype == 'uint8':
-        rosnp = rosnp.tobytes()
+        _count_copy('bytes')
+        rosnp = array.tobytes()
+    else:
+        if not array.dtype.isnative:
+            # memoryview cannot iterate non-native elements
+            _count_copy('byteorder')
+            array = array.astype(array.dtype.newbyteorder('='))
+        if not array.flags.c_contiguous:
+            _count_copy('contiguous')
+        # Elements of a memoryview iterate as Python scalars for genpy.
+        rosnp = memoryview(array.ravel())
     
     # Select the message class and instantiate an object.
     try:
@@ -89,7 +139,28 @@ def encode_rosnp(array: np.ndarray):
         return msg    
 
 
-def encode_rosnp_list(array_list: List[np.ndarray]):
+def _encode_raw(array: np.ndarray) -> ROSNumpy:
+    """Build a ROSNumpy message holding the array's little-endian bytes."""
+    func_name = "rosnp_helpers.encode_rosnp"
+
+    if array.dtype.kind not in RAW_KINDS:
+        raise TypeError(
+            f"<{func_name}> Input dtype {array.dtype} is not numeric."
+        )
+    # tobytes copies in C order, strided or not: swap bytes only if needed.
+    dtype = array.dtype.newbyteorder(RAW_BYTEORDER)
+    if array.dtype != dtype:
+        _count_copy('byteorder')
+        array = array.astype(dtype)
+
+    msg = ROSNumpy()
+    msg.shape, msg.dtype = array.shape, array.dtype.name
+    _count_copy('bytes')
+    msg.rosnp = array.tobytes()
+    return msg
+
+
+def encode_rosnp_list(array_list: List[np.ndarray], raw: bool = False):
     """
     Create a ROSNumpyList message of the necessary type.
     Infers the type based on the dtype of the first array.
@@ -99,6 +170,9 @@ def encode_rosnp_list(array_list: List[np.ndarray]):
     array_list: List[np.ndarray]
         The list of Numpy arrays to send as a message.
         NOT a list of ROSNumpy messages.
+    raw: bool, optional
+        Build a ROSNumpyList of raw ROSNumpy messages (see encode_rosnp).
+        The arrays may then have different dtypes.
 
     Output(s):
     msg:
@@ -114,7 +188,7 @@ def encode_rosnp_list(array_list: List[np.ndarray]):
         )
     
     # Create list of msgs
-    msg_arr = [encode_rosnp(arr) for arr in array_list]
+    msg_arr = [encode_rosnp(arr, raw=raw) for arr in array_list]
 
     # Determine message to use
     msg_type = type(msg_arr[0])
@@ -138,6 +212,8 @@ def encode_rosnp_list(array_list: List[np.ndarray]):
 def decode_rosnp(msg):
     """
     Reconstructs Numpy array from ROSNumpy-typed message.
+    ROSNumpy (raw) messages, and uint8 messages, decode to a read-only view
+    of the message's bytes; copy the array to modify it.
 
     Parameter(s):
     msg: 
@@ -150,7 +226,7 @@ def decode_rosnp(msg):
     func_name = "rosnp_helpers.decode_rosnp"
 
     # print(type(msg.rosnp), msg.rosnp)
-    msg_types = list(rosnp_dict.values())
+    msg_types = list(rosnp_dict.values()) + [ROSNumpy]
     if type(msg) not in msg_types:
         print(
             f"<{func_name}> Message type {type(msg)} not"
@@ -161,7 +237,10 @@ def decode_rosnp(msg):
         raise TypeError   
     
     shape, dtype, data = msg.shape, msg.dtype, msg.rosnp
-    if dtype == 'uint8':
+    if type(msg) is ROSNumpy:
+        dtype = np.dtype(dtype).newbyteorder(RAW_BYTEORDER)
+        result_array = np.frombuffer(data, dtype=dtype).reshape(shape)
+    elif dtype == 'uint8':
         result_array = np.ndarray(shape, dtype=dtype, buffer=data)
     else:
         result_array = np.array(data, dtype=dtype).reshape(shape)
@@ -90,7 +90,7 @@ class NodeLiaison:
             '''
             self.collect = False
             msg = DepthImgReqResponse(
-                depth_imgs=encode_rosnp_list(self.imgs)
+                depth_imgs=encode_rosnp_list(self.imgs, raw=True)
             )
             self.amount = -1
             self.imgs.clear()
@@ -17,7 +17,9 @@ from rosnp_msgs.msg import ROSNumpyList_Float32, ROSNumpy_UInt16
 from rosnp_msgs.rosnp_helpers import decode_rosnp_list, encode_rosnp
 from std_msgs.msg import Header, Float32
 from geometry_msgs.msg import Point, PointStamped, PoseStamped, Quaternion, Pose
-from uav_follower.kmeans import KMeans
+from uav_follower.kmeans import (
+    KMeans, ClusterResult, IterationInfo, WarmStartKMeans
+)
 from uav_follower.srv import DepthImgReq, TF2Poll
 from std_srvs.srv import Empty
 
@@ -44,6 +46,21 @@ class DataProcessor:
         self.MAX_ACCEL = rospy.get_param('~max_accel', default=5)
         self.DEPTH_IMG_COUNT = rospy.get_param('depth_img_count')
         self.FOLLOW_DIST = rospy.get_param("follow_distance")
+        self.WARM_START = rospy.get_param('~warm_start', default=True)
+        # Box distance for clustering (see uav_follower.kmeans.METRICS)
+        self.METRIC = rospy.get_param('~metric', default='euclidean')
+        # Persistent clusterer; starts each batch from the last centroids.
+        self.clusterer = WarmStartKMeans(
+            max_age=rospy.get_param('~max_centroid_age', default=3),
+            min_count=self.COUNT_THRESH,
+            reset_ratio=rospy.get_param('~reset_ratio', default=2.0),
+            # None: the threshold below, or 0 for 'iou' (see WarmStartKMeans)
+            rms_floor=rospy.get_param('~reset_floor', default=None),
+            threshold=0.05,
+            metric=self.METRIC,
+            observer=self._log_iteration if self.debug else None
+        )
+        self.kmeans = None  # Cold-start model of the last batch
 
         topics = rospy.get_param('topics')
         waypoints_topic = rospy.get_param('~waypoints')  # launch file
@@ -144,10 +161,10 @@ class DataProcessor:
             0. kmeans_data: dict
                 A dictionary of data for kmeans clustering. Includes (in order)
 
-                - xyxyns: list
+                - xyxyns: np.ndarray
                     key: 'xyxyns'.
                     
-                    This holds the flat container of bbox coordinates.
+                    This holds the flat (N, 4) array of bbox coordinates.
 
                 - k_val: int
                     key: 'k'
@@ -177,16 +194,15 @@ class DataProcessor:
         
         xyxyns = [arr[..., :4] for arr in detections]  # normalized bbox coords
         
-        flattened, k_val, means = [], 0, None
+        k_val, means = 0, None
         for arr in xyxyns:
             num_rows = arr.shape[0]
-            for row in arr:
-                flattened.append(row)
             if num_rows > k_val:
                 k_val = num_rows
                 means = arr
         else:
             assert k_val == len(means)
+        flattened = np.concatenate(xyxyns)
 
         kmeans_params = {
             'xyxyns': flattened,
@@ -198,37 +214,59 @@ class DataProcessor:
         other_data = {}
         return kmeans_params, other_data
     
-    def cluster_data(self, kmeans_params: dict) -> Tuple[dict, list, int]:
-        """Performs kmeans clustering and returns relevant data"""
+    def cluster_data(self, kmeans_params: dict) -> ClusterResult:
+        """Performs kmeans clustering and returns the clustering result"""
         k = kmeans_params['k']
         xyxyns = kmeans_params['xyxyns']
         init_means = kmeans_params['means']
 
-        self.kmeans = KMeans(
-            data=xyxyns,
-            initial_means=init_means,
-            segments=k,
-            threshold=0.05
-        )
-        clusters, centroids, _ = self.kmeans.cluster()
-        # print(f'<cluster_data>: {clusters}\nCentroids: {centroids}')
-        return clusters, centroids
+        if self.WARM_START:
+            result = self.clusterer.cluster(xyxyns, k, init_means)
+        else:
+            self.kmeans = KMeans.from_array(
+                xyxyns,
+                initial_means=init_means,
+                segments=k,
+                threshold=0.05,
+                metric=self.METRIC,
+                observer=self._log_iteration if self.debug else None
+            )
+            result = self.kmeans.cluster()
+        # print(f'<cluster_data>: {result.labels}\nCentroids: {result.centroids}')
+        return result
     
-    def filter_clusters(
-            self,
-            clusters: dict,
-            centroids: np.ndarray
-    ) -> dict:
+    def classify_detections(self, xyxyns: np.ndarray) -> np.ndarray:
+        """
+        Label new detection rows with the closest of last cycle's cluster
+        centroids, without re-clustering. Returns an empty array if no
+        batch has been clustered yet.
+        """
+        model = self.clusterer if self.WARM_START else self.kmeans
+        if model is None:
+            return np.array([], dtype=np.intp)
+        try:
+            return model.predict(xyxyns)
+        except RuntimeError:
+            # Not fitted yet
+            return np.array([], dtype=np.intp)
+
+    def _log_iteration(self, info: IterationInfo) -> None:
+        """KMeans observer; logs convergence statistics in debug mode."""
+        # Node runs at INFO level; this observer is only set in debug mode.
+        rospy.loginfo(
+            f"<cluster_data>: Iteration {info.iteration}: "
+            f"{info.wall_time*1e3:.2f} ms, inertia {info.inertia:.5f}, "
+            f"max shift {info.max_shift:.5f}, {info.n_changed} changed"
+        )
+
+    def filter_clusters(self, result: ClusterResult) -> dict:
         """
         Remove clusters that are likely not valid detections.
 
         Parameters
         ----------
-        clusters : dict
-            Clusters from KMeans.cluster function.
-
-        centroids : np.ndarray
-            Centroids from KMeans.cluster function.
+        result : ClusterResult
+            Output of the KMeans.cluster function.
 
         Returns
         -------
@@ -250,13 +288,12 @@ class DataProcessor:
         # ================
         # Begin Filtering
         # ================
-        for key in clusters:
+        for key in range(result.segments):
 
-            cluster = clusters[key]
-            centroid = centroids[key]
+            centroid = result.centroids[key]
 
             # Stage 1: Minimum point count
-            clust_point_count = len(cluster)
+            clust_point_count = result.counts[key]
             if clust_point_count >= MIN_POINT_COUNT:
                 ...
                 # Stage 2: Density Calculation
@@ -266,9 +303,8 @@ class DataProcessor:
                 Use the area of said circle to calculate density as 
                     points/area
                 '''
-                distances = np.array([np.linalg.norm(cluster[i] - centroid)
-                                    for i in range(clust_point_count)])
-                distances = np.sort(distances)
+                cluster = result.points(key)[:, :len(centroid)]
+                distances = np.sort(np.linalg.norm(cluster - centroid, axis=1))
 
                 vel = distances[1:]-distances[0:-1]
                 accel = vel[1:] - vel[:-1]
@@ -666,11 +702,15 @@ class DataProcessor:
         It coordinates the other methods.
         """
         kmeans_data, _ = self.process_detections(detections_msg)
-        clusters, centroids = self.cluster_data(kmeans_data)
-        uav_candidates = self.filter_clusters(
-            clusters=clusters,
-            centroids=centroids
-        )
+        if self.debug:
+            prev_labels = self.classify_detections(kmeans_data['xyxyns'])
+            if prev_labels.size:
+                rospy.loginfo(
+                    "<detections_callback>: Detections per previous cluster: "
+                    f"{np.bincount(prev_labels)}"
+                )
+        result = self.cluster_data(kmeans_data)
+        uav_candidates = self.filter_clusters(result)
         # End callback if no candidates
         if not uav_candidates:
             self.bad_detect_req()
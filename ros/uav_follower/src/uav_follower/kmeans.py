@@ -10,8 +10,13 @@
 # from __future__ import annotations
 
 from collections.abc import MutableMapping
-from typing import ClassVar
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import ClassVar, NamedTuple
 import copy
+import math
+import os
+import pickle
+import time
 import numpy as np
 
 
@@ -45,22 +50,129 @@ class KMeans:
             clusters using user-defined thresholding and
             iteration limit. All three parameters are adjustable via
             attribute assignment.
+
+        - Initialization:
+            If `initial_means` is not given, the starting means are chosen
+            by `init`: 'random' (k distinct data points), 'k-means++', or
+            'greedy-k-means++'. `init` may also be a callable
+            `init(points, k, rng) -> means` or a (k, ndim) array of
+            starting means (which, unlike `initial_means`, need not be
+            among the data). Pass `seed` for reproducible results.
+
+        - Compute Precision:
+            Distances, centroids, and convergence checks are computed in
+            `dtype`: float32 (the default, matching the detection data) or
+            float64. Data already in that dtype is used without conversion;
+            centroid sums are still accumulated in float64.
+
+        - Instrumentation:
+            `cluster` prints nothing. To follow convergence, pass an
+            `observer`: a callable that is given an IterationInfo (wall
+            time, inertia, largest centroid shift, and number of points
+            that changed label) after every iteration. IterationRecorder
+            is a ready-made observer that keeps them in a list.
+
+        - Fast Construction:
+            The constructor converts the data to a 2D array once (no copy if
+            it already is one) and caches the result of its data checks.
+            When the data is already a contiguous float array of the points
+            to cluster, `KMeans.from_array` skips the data checks entirely
+            and uses the array without copying it.
+
+        - Restarts:
+            With randomly chosen initial means, `n_init` independent runs
+            are made and the one with the lowest inertia is kept. Each run
+            gets its own seed drawn from `seed`, so results are
+            reproducible. With `n_jobs` > 1 the runs are spread over a
+            process pool (`executor='process'`) or, since the vectorized
+            kernels release the GIL, a thread pool (`executor='thread'`).
+            Each worker process receives the data once and makes a
+            contiguous share of the runs. A callable `init` or `metric`
+            that cannot be pickled (ex. a lambda) makes the runs use a
+            thread pool instead. Observers are not called for runs made in
+            other processes.
+
+        - Metric:
+            `metric` chooses the distance used to assign points to means:
+            'euclidean' (default), 'sqeuclidean', 'centre' (distance
+            between the centres of xyxy boxes), 'iou' (1 - IoU of xyxy
+            boxes), or a callable `metric(points, means)` returning the
+            (N, K) distance matrix in one vectorized call (see METRICS).
+            Centroids are still the mean of each cluster. The inertia is
+            the sum of squared Euclidean distances for both Euclidean
+            metrics ('sqeuclidean' only ranks means the same way, more
+            cheaply), and the sum of squared metric distances otherwise.
+            Only the Euclidean metrics work with the accelerated
+            algorithms.
+
+        - Sample Weights:
+            `sample_weight` gives each point a non-negative weight: the
+            centroids become weighted means, the inertia a weighted sum,
+            and the built-in initializers sample points in proportion to
+            their weight. A point of weight w behaves like w copies of it.
+            `cluster_unique` uses this to cluster only the distinct rows of
+            data with many duplicates (ex. image colours).
+
+        - Threads:
+            With `n_threads` > 1 (None for one per CPU), each iteration
+            splits the points into one contiguous chunk per thread and
+            runs them on a thread pool; NumPy releases the GIL in the
+            distance kernels. Each thread labels its chunk (with its own
+            assignment engine). The centroids are then summed in one pass
+            over all the points, in the same order as with one thread, so
+            the result is the same as with one thread (floating-point sums
+            depend on their order). The pool is kept for later runs.
+
+        - Prediction:
+            After `cluster`, the result is kept in `result`. `predict`
+            labels new points with their closest centroid and `transform`
+            gives their distance to every centroid, working through large
+            arrays `chunk_size` rows at a time. This allows fitting on a
+            sample and labeling the full data set.
+
+        - Algorithm:
+            `algorithm` selects how points are assigned to means each
+            iteration. 'lloyd' computes every point-mean distance.
+            'hamerly' (one lower bound per point) and 'elkan' (one lower
+            bound per point-mean pair) use the triangle inequality to skip
+            distances that cannot change a label; they give the same
+            clusters as 'lloyd' (their bound tests allow for the rounding
+            of float32 distances, and near-ties are ranked with the
+            'lloyd' distances) and pay off as k grows. 'kdtree' filters
+            candidate means for whole kd-tree nodes at once (Kanungo et
+            al.); it also matches 'lloyd' and suits low-dimensional data
+            with many points, such as the 4D detection boxes. Its tree is
+            built on the first run and reused while the data is unchanged
+            (do not modify the data in place between runs).
     """
 
     # =================
     # Class Variables
     # =================
     _THRESH_MAX: ClassVar[int] = 1
+    # Set by `from_array`; skips the data-dependent validation.
+    _trusted: ClassVar[bool] = False
+    _EXECUTORS: ClassVar[dict] = {
+        'process': ProcessPoolExecutor,
+        'thread': ThreadPoolExecutor
+    }
    
     # =================
     # Instance Variables
     # =================
-    data: list
+    data: np.ndarray
     segments: int
     threshold: float
     maxIterations: int
     initial_means: np.ndarray
     ndim: int
+    init: object
+    algorithm: str
+    observer: object
+    dtype: np.dtype
+    result: 'ClusterResult'
+    sample_weight: np.ndarray
+    metric: object
 
     # =================
     # Initialization
@@ -73,21 +185,76 @@ class KMeans:
             segments=2,
             initial_means=None,
             threshold=0.5,
-            maxIterations=100
+            maxIterations=100,
+            init='k-means++',
+            seed=None,
+            algorithm='lloyd',
+            observer=None,
+            dtype=np.float32,
+            n_init=1,
+            n_jobs=1,
+            executor='process',
+            sample_weight=None,
+            metric='euclidean',
+            n_threads=1
     ):
 
-        self._data = data
+        if self._trusted:
+            if not isinstance(data, np.ndarray) or data.ndim != 2:
+                raise TypeError("Trusted data must be a 2D Numpy array.")
+            self._data = data
+        else:
+            self._data = self._asArray(data)
         self._initial_means = initial_means
         self._segments = segments
         self._threshold = threshold
         self._maxIterations = maxIterations
+        self._init = init
+        self._rng = check_random_state(seed)
+        self._algorithm = algorithm
+        self.observer = observer
+        self._dtype = np.dtype(dtype)
+        self._n_init = n_init
+        self._n_jobs = n_jobs
+        self._executor = executor
+        self._sample_weight = sample_weight
+        self._metric = metric
+        self._n_threads = os.cpu_count() if n_threads is None else n_threads
+        self._pool = None  # thread pool of the chunked assignment
+        self.result = None  # set by `cluster`
+        self._tree = None  # kd-tree of the 'kdtree' algorithm
+        # (data, means, ndim) combination whose means were last verified
+        self._checked_means = None
 
         if ndim == 0:
-            self._ndim = min(len(x) for x in data)
+            self._ndim = self._data.shape[1]
         else:
             self._ndim = ndim
         self._validateParams()
 
+    @classmethod
+    def from_array(cls, points: np.ndarray, **kwargs) -> 'KMeans':
+        """
+        Construct a KMeans object from trusted data without copying it.
+
+        `points` must be a 2D array (ideally C-contiguous, of the compute
+        `dtype`, with exactly `ndim` columns, so clustering needs no
+        conversion). Any
+        `initial_means` are trusted to be unique and among the data. Only
+        the scalar parameters are validated.
+
+        Parameters
+        ----------
+        points : np.ndarray
+            (N, >=ndim) array of data points.
+        **kwargs
+            Keyword arguments of the KMeans constructor.
+        """
+        kmeans = cls.__new__(cls)
+        kmeans._trusted = True
+        kmeans.__init__(points, **kwargs)
+        return kmeans
+
 
     # ============
     # Properties
@@ -95,8 +262,10 @@ class KMeans:
     '''Use these instead of explicit getters and setters'''
     @property
     def data(self):
-        """Returns a copy of the object's data"""
-        return copy.deepcopy(self._data)
+        """Returns a read-only view of the object's data"""
+        view = self._data.view()
+        view.flags.writeable = False
+        return view
 
     @property
     def segments(self):
@@ -119,6 +288,68 @@ class KMeans:
             self._segments = old_val
             raise
 
+    @property
+    def init(self):
+        """Method used to choose the initial means (see class docstring)."""
+        return self._init
+
+    @init.setter
+    def init(self, value):
+        old_init = self._init
+        try:
+            self._init = value
+            self._validateParams()
+        except (TypeError, ValueError):
+            self._init = old_init
+            raise
+
+    @property
+    def algorithm(self):
+        """
+        Label assignment algorithm ('lloyd', 'hamerly', 'elkan', or
+        'kdtree').
+        """
+        return self._algorithm
+
+    @algorithm.setter
+    def algorithm(self, value: str):
+        old_algorithm = self._algorithm
+        try:
+            self._algorithm = value
+            self._validateParams()
+        except ValueError:
+            self._algorithm = old_algorithm
+            raise
+
+    @property
+    def n_init(self):
+        """Number of randomly initialized runs; the best is kept."""
+        return self._n_init
+
+    @n_init.setter
+    def n_init(self, value: int):
+        if not isinstance(value, int):
+            raise TypeError("Value must be an integer.")
+        elif value < 1:
+            raise ValueError("Value must be at least 1.")
+        else:
+            self._n_init = value
+
+    @property
+    def metric(self):
+        """Name of the distance metric (or the metric callable)."""
+        return self._metric
+
+    @property
+    def sample_weight(self):
+        """(N,) weight of each data point, or None (all weigh one)."""
+        return self._sample_weight
+
+    @property
+    def dtype(self):
+        """Floating-point type that distances and centroids are computed in."""
+        return self._dtype
+
     @property
     def threshold(self):
         """Threshold for k-means clustering."""
@@ -173,30 +404,117 @@ class KMeans:
     # ===============
 
     # ::Public methods::
-    def cluster(self) -> tuple:
+    def cluster(self) -> 'ClusterResult':
         """
         The main event; performs the data clustering operation.
 
-        Parameters
-        ----------
-        display : bool, optional
-            Whether to live-plot the data or not. The default is False.
-
         Returns
         -------
-        tuple
-            [Clusters, Centroids, IterationCount]
+        ClusterResult
+            Labels, centroids, per-cluster counts, inertia, the
+            iteration count, and the number of point-mean distances
+            computed during the clustering operation. With `n_init` > 1,
+            the result of the run with the lowest inertia.
+
+        """
+        # Slice and cast the data once; every iteration reuses this array.
+        points = self._asPoints(self._data, self.ndim, self._dtype)
+
+        # Restarts only differ if the initial means are random.
+        random_init = self._initial_means is None and (
+            isinstance(self._init, str) or callable(self._init)
+        )
+        if self._n_init == 1 or not random_init:
+            self.result = self._clusterOnce(points, self._rng)
+            return self.result
+
+        seeds = self._rng.randint(np.iinfo(np.int32).max, size=self._n_init)
+        in_process = self._n_jobs == 1 or self._executor == 'thread' \
+            or not self._picklable()
+        if in_process and self._algorithm == 'kdtree' and self._n_threads == 1:
+            self._assigner(points)  # Build the tree once for every restart.
+        if self._n_jobs == 1:
+            results = [
+                self._clusterOnce(points, np.random.RandomState(seed))
+                for seed in seeds
+            ]
+        elif in_process:
+            with ThreadPoolExecutor(max_workers=self._n_jobs) as pool:
+                results = list(pool.map(
+                    lambda seed: self._clusterOnce(
+                        points, np.random.RandomState(seed)
+                    ),
+                    seeds
+                ))
+        else:
+            # Workers get a copy without the observer (it may not pickle),
+            # thread pool, or kd-tree, and send back results without the
+            # data. One task per worker: the data is pickled n_jobs times,
+            # not once per restart.
+            worker = copy.copy(self)
+            worker.observer = None
+            worker._pool = None
+            worker._tree = None
+            chunks = [chunk for chunk in np.array_split(seeds, self._n_jobs)
+                      if chunk.size]
+            with ProcessPoolExecutor(max_workers=self._n_jobs) as pool:
+                results = list(pool.map(
+                    _clusterRestarts, [worker] * len(chunks), chunks
+                ))
+            for result in results:
+                result.data = self._data
+        self.result = min(results, key=lambda result: result.inertia)
+        return self.result
+
+    def _picklable(self) -> bool:
+        """Whether a callable `init` and `metric` can go to other processes."""
+        for func in (self._init, self._metric):
+            if callable(func):
+                try:
+                    pickle.dumps(func)
+                except (pickle.PicklingError, AttributeError, TypeError):
+                    return False
+        return True
 
+    def predict(self, data, chunk_size=None) -> np.ndarray:
+        """
+        Label each row of `data` with the index of the closest centroid of
+        the last clustering operation (see `nearest_centroids`).
+        """
+        return nearest_centroids(
+            data, self._fittedCentroids(), chunk_size=chunk_size,
+            dtype=self._dtype, metric=self._metric
+        )
+
+    def transform(self, data, chunk_size=None) -> np.ndarray:
+        """
+        Distance (in the KMeans metric) from each row of `data` to every
+        centroid of the last clustering operation (see
+        `centroid_distances`).
+        """
+        return centroid_distances(
+            data, self._fittedCentroids(), chunk_size=chunk_size,
+            dtype=self._dtype, metric=self._metric
+        )
+
+    # ::Private methods::
+    def _fittedCentroids(self) -> np.ndarray:
+        if self.result is None:
+            raise RuntimeError("KMeans must be clustered before predicting.")
+        return self.result.centroids
+
+    def _clusterOnce(self, points: np.ndarray, rng) -> 'ClusterResult':
+        """
+        Run the clustering loop once, drawing any random initial means
+        from `rng`.
         """
         # Initialize Variables
-        this_func = 'KMeans.cluster'
         data = self._data
-        K_NUM = self._segments
         THRESH = self._threshold
         ndim = self.ndim
 
         # Declare variables
-        clusters, centroids, means = None, None, None
+        labels, centroids, counts, means = None, None, None, None
 
         # ===================
         # Set initial means
@@ -206,72 +524,99 @@ class KMeans:
         if self._initial_means is not None:
             means = self._initial_means
         else:
-            # get k random points to serve as initial means
-            print(f"<{this_func}>: Generating initial means...")
-            means_found = False
-
-            # Loop until the mean points are found. It shouldn't loop at
-            # all since repeat points are unlikely, but with randomization,
-            # there's always a chance, so I placed a check for uniqueness.
-            while not means_found:
-                # index = np.random.randint(0, len(data))
-                means = np.array([
-                    data[
-                        np.random.randint(0, len(data))][:self.ndim]
-                        for _ in range(K_NUM)
-                ])
-
-                # Sanity Check
-                length = len(means)
-                assert length == K_NUM
-                # Ensure no duplicate point; don't care about row order in
-                # means array, so no need to pass `return_index=True` and
-                # recover original means sort order.
-                check = np.unique(means, axis=0)
-                '''print(f'{this_func}: Means Generated:\n{means}')
-                print(check)
-                print('')'''
-                if len(check) == length:
-                    means_found = True
-                    # print(means)
+            means = self._initialMeans(points, rng)
         # print(f'Means Check:\n{means}')
+        means = np.ascontiguousarray(means[:, :ndim], dtype=self._dtype)
         # Begin loop; Currently, the program will loop until each calculated
         # cluster centroid is within THRESH distance from the mean found in the
         # previous iteration, or until the iteration limit is reached,
         # whichever happens first.
         # I may change this calculation to use statistical variance in the future
         # if that's more "legitimate".
-        thresh_reached = False
+        thresh_reached = converged = False
         iterations = 0
-        print(f"<{this_func}>: Cluster Iteration Count:")
+        assigner = self._assigner(points)
+        observer = self.observer
 
         while not thresh_reached:
             # Assign clusters
             iterations += 1
             if iterations >= self._maxIterations:
-                print(f"<{this_func}>: Max iterations reached. Returning output.")
                 thresh_reached = True
-            print(iterations)
+            if observer is not None:
+                start, prev_labels = time.perf_counter(), labels
 
-            clusters = self._assignLabels(means, data)
-            # print(f'Clusters: {clusters}')
-            centroids = self._findCentroids(clusters)
+            labels = assigner(means)
+            centroids, counts = self._findCentroids(points, labels, means)
             # print(f'Centroids: {centroids}')
 
-            # Compare centroids to previous means.
-            for i in range(len(centroids)):
-                distance = self._calcDistance(centroids[i], means[i])
-                if distance > THRESH:
-                    # Assign new means
-                    means = centroids
-                    break
+            # Compare centroids to previous means (all at once).
+            shifts = np.linalg.norm(centroids - means, axis=1)
+            if np.any(shifts > THRESH):
+                # Assign new means
+                means_used, means = means, centroids
             else:
-                thresh_reached = True
-        if iterations < self._maxIterations:
-            print(f"{this_func}: Successful cluster operation.\n")
-        return [clusters, centroids, iterations]
+                means_used = means
+                thresh_reached = converged = True
+
+            if observer is not None:
+                # Inertia of the labels w.r.t. the means that produced them.
+                observer(IterationInfo(
+                    iteration=iterations,
+                    wall_time=time.perf_counter() - start,
+                    inertia=self._inertia(points, means_used, labels),
+                    max_shift=float(shifts.max()),
+                    n_changed=int(
+                        len(labels) if prev_labels is None
+                        else np.count_nonzero(labels != prev_labels)
+                    )
+                ))
+
+        return ClusterResult(
+            data=data,
+            labels=labels,
+            centroids=centroids,
+            counts=counts,
+            inertia=self._inertia(points, centroids, labels),
+            iterations=iterations,
+            distance_count=assigner.distance_count,
+            converged=converged
+        )
+
+    def _assigner(self, points: np.ndarray):
+        """
+        The assignment engine for one clustering operation; split over the
+        thread pool with `n_threads` > 1.
+        """
+        if self._n_threads > 1:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self._n_threads)
+            return _ThreadedAssigner(
+                points,
+                lambda chunk: self._engine(chunk, cache_tree=False),
+                self._pool,
+                self._n_threads
+            )
+        return self._engine(points)
+
+    def _engine(self, points: np.ndarray, cache_tree: bool = True):
+        """
+        The assignment engine of `algorithm` for `points`. The kd-tree is
+        built once per data set and kept for later runs on the same data
+        (unless `cache_tree` is False).
+        """
+        engine = ALGORITHMS[self._algorithm]
+        if engine is _LloydAssigner:
+            return engine(points, metric=self._metric)
+        if engine is not _KDTreeAssigner:
+            return engine(points)
+        if not cache_tree:
+            return engine(points)
+        tree = self._tree
+        if tree is None or tree.key != _arrayKey(points):
+            tree = self._tree = _KDTree(points)
+        return engine(points, tree=tree)
 
-    # ::Private methods::
     def _validateParams(self):
         """
         Validate configuration for KMeans object.
@@ -285,12 +630,10 @@ class KMeans:
         initial_means = self._initial_means
         accepted_types = [list, tuple, np.ndarray]
 
-        # Check if data is stored properly (flat and in a container)
-
         # Ensure data has suitable dimensionality
         if ndim <= 0:
             raise ValueError("Data must have at least one dimension.")
-        if any([len(arr) < ndim for arr in data]):
+        if data.shape[1] < ndim:
             raise ValueError(
                 f"Each data point must have at least {ndim} components."
             )
@@ -309,186 +652,1859 @@ class KMeans:
         if MAX_ITERATIONS <= 0:
             raise ValueError("Must have at least one iteration.")
 
+        if self._algorithm not in ALGORITHMS:
+            raise ValueError(
+                f'Algorithm must be one of {list(ALGORITHMS)}.'
+            )
+        if self._dtype not in (np.float32, np.float64):
+            raise TypeError("Compute dtype must be float32 or float64.")
+        if self._n_init < 1 or (self._n_jobs is not None and self._n_jobs < 1) \
+                or self._n_threads < 1:
+            raise ValueError("n_init, n_jobs, and n_threads must be at least one.")
+        if self._executor not in KMeans._EXECUTORS:
+            raise ValueError(
+                f'Executor must be one of {list(KMeans._EXECUTORS)}.'
+            )
+        metric = self._metric
+        if isinstance(metric, str):
+            if metric not in METRICS:
+                raise ValueError(
+                    f'Unknown metric \'{metric}\'. Use one of the '
+                    f'following:\n{list(METRICS)}'
+                )
+            if metric in _BOX_METRICS and ndim < 4:
+                raise ValueError(
+                    f"Metric '{metric}' needs xyxy boxes (ndim >= 4)."
+                )
+        elif not callable(metric):
+            raise TypeError("Metric must be a name in METRICS or a callable.")
+        if self._algorithm != 'lloyd' and metric not in _EUCLIDEAN_METRICS:
+            raise ValueError(
+                f"Algorithm '{self._algorithm}' needs a Euclidean metric."
+            )
+        if self._sample_weight is not None:
+            weights = np.asarray(self._sample_weight, dtype=np.float64)
+            if weights.shape != (len(data),):
+                raise ValueError("Need one sample weight per data point.")
+            if not np.all(np.isfinite(weights)) or np.any(weights < 0) \
+                    or not weights.any():
+                raise ValueError(
+                    "Sample weights must be finite, non-negative, and not "
+                    "all zero."
+                )
+            self._sample_weight = weights
+
+        init = self._init
+        if isinstance(init, str):
+            if init not in INITIALIZERS:
+                raise ValueError(
+                    f'Unknown initializer \'{init}\'. Use one of the '
+                    f'following:\n{list(INITIALIZERS)}'
+                )
+        elif not callable(init):
+            init = np.asarray(init, dtype=np.float64)
+            if init.ndim != 2 or len(init) != K_NUM or init.shape[1] < ndim:
+                raise ValueError(
+                    "Initial means array must have shape "
+                    f"({K_NUM}, >={ndim}). Got {init.shape}."
+                )
+            if len(np.unique(init[:, :ndim], axis=0)) != K_NUM:
+                raise ValueError("Initial means must be unique.")
+            self._init = init
+
         if initial_means is not None:
             if type(initial_means) not in accepted_types:
                 raise TypeError('Means container must be one of the following:'
                                 f'\n{accepted_types}')
-            else:
-                temp_means = [arr[0:ndim] for arr in initial_means]
-                temp_data = [arr[0:ndim] for arr in data]
-                initial_means = np.array(temp_means, dtype=np.float64)
-                data = np.array(temp_data)
-                # print(initial_means)
             # Check element types and values.
-            if any([type(arr) not in accepted_types for arr in initial_means]):
+            if not isinstance(initial_means, np.ndarray) and any(
+                    [type(arr) not in accepted_types for arr in initial_means]
+            ):
                 raise TypeError('All means points must be one of the following input types:'
                                 f'\n{accepted_types}')
-            """
-            Nested logic comparison:
-                - check = np.equal(data[:, 0:ndim], entry)
-                    - checks for element-wise equality between a given entry
-                    in `initial_means` and each row in `data` up to the `ndim`th element.
-                    Output array is of shape (len(data), ndim).
-
-                - check2 = check.all(axis=1)
-                    - Tests if all elements in a row of `check` are True for
-                    each row in `check`
-                    - "For each row in `check`, test if all column entries
-                    are True."
-                    - Passing in axis=0 would check if all elements among
-                    columns were True for each column in `check`
-                    - Left with a 1-D T/F array (i.e., flat) of length len(data).
-
-                - check3 = (any(np.equal(data, entry).all(1) for entry in initial_means[:, 0:ndim)
-                    - Returns a generator where each element is a single T/F value.
-                    - Each element is communicating if there are any entries in `data` that are completely equivalent
-                    with an entry in initial_means.
-                    - Outputs generator (length = K_NUM)
-
-                - all(check3)
-                    - Is every entry in initial_means represented in `data`?
-                    - Outputs a single T/F.
-            """
-            if not all(
-                    any(
-                        np.equal(data[:, 0:ndim], entry).all(1)
-                    )
-                    for entry in initial_means[:, 0:ndim]
-            ):
-                raise ValueError("Provided means must be among the data.")
+            initial_means = np.asarray(initial_means, dtype=np.float64)
+            if initial_means.ndim != 2 or initial_means.shape[1] < ndim:
+                raise ValueError(
+                    f"Each mean point must have at least {ndim} components."
+                )
+            if len(initial_means) != K_NUM:
+                raise ValueError(
+                    "Number of unique mean points must == number of segments."
+                )
+
+            # The means only need to be checked against the data once per
+            # combination of data, means, and ndim.
+            key = (id(data), id(initial_means), ndim)
+            if not self._trusted and key != self._checked_means:
+                self._checkMeans(data, initial_means, ndim)
+                self._checked_means = key
+
+        self._initial_means = initial_means
+        return True
+
+    @staticmethod
+    def _checkMeans(data: np.ndarray, initial_means: np.ndarray, ndim: int):
+        """
+        Check that every initial mean is among the data and that there are
+        no duplicate means (comparing the first `ndim` components).
+        """
+        # View each row as a single opaque value so whole rows can be
+        # compared at once with np.isin and np.unique. Float data is
+        # compared in its own dtype to avoid converting it.
+        dtype = data.dtype if data.dtype.kind == 'f' else np.dtype(np.float64)
 
-            # Remove duplicates and check remaining length
-            # Turns out np.unique changes the order of the data.
-            # https://stackoverflow.com/questions/15637336/numpy-unique-with-order-preserved
+        def row_keys(arr):
+            arr = np.ascontiguousarray(arr[:, :ndim], dtype=dtype) + dtype.type(0)
+            return arr.view(np.dtype((np.void, arr.itemsize * ndim))).ravel()
 
-            # print(f'Before: {initial_means}')
+        mean_keys = row_keys(initial_means)
+        if not np.isin(mean_keys, row_keys(data)).all():
+            raise ValueError("Provided means must be among the data.")
 
-            # Check for unique rows in means array; no duplicate means
-            # Use slices of initial_means because we are only concerned about uniqueness among the dimensions we are
-            # clustering
-            filtered_initial_means, ndx = np.unique(
-                np.copy(initial_means[:, :ndim]),  # use copy so original array order remains the same.
-                axis=0,
-                return_index=True
+        # Check for unique rows in means array; no duplicate means
+        if len(np.unique(mean_keys)) != len(mean_keys):
+            raise ValueError(
+                "Number of unique mean points must == number of segments."
             )
-            # Check length
-            try:
-                length = len(filtered_initial_means)
-                assert length == K_NUM
-            except AssertionError:
-                print("\nNumber of unique mean points must == number of segments.\n")
-                raise
-            # print(ndx)
 
-            # If the function gets here, there were no duplicate means among the slices.
-        # Retain conversion to Numpy array if made
-        self._data = data
-        self._initial_means = initial_means
-        return True
+    def _initialMeans(self, points: np.ndarray, rng) -> np.ndarray:
+        """
+        Choose the starting means according to `init`.
 
-    def _assignLabels(self, means: np.ndarray, data: np.ndarray):
+        Returns
+        -------
+        means : np.ndarray
+            (K, ndim) array of starting means.
         """
-        Separate the data into clusters.
+        init = self._init
+        if isinstance(init, str):
+            init = INITIALIZERS[init]
+        if self._sample_weight is not None and any(
+                init is func for func in INITIALIZERS.values()):
+            means = init(points, self._segments, rng,
+                         sample_weight=self._sample_weight)
+        elif callable(init):
+            means = init(points, self._segments, rng)
+        else:
+            means = init
+        return np.asarray(means)[:, :self.ndim]
+
+    def _inertia(self, points: np.ndarray, centres: np.ndarray,
+                 labels: np.ndarray) -> float:
+        """
+        (Weighted) sum of squared metric distances from each point to its
+        centre; squared Euclidean distances for both Euclidean metrics.
+        """
+        if self._metric in _EUCLIDEAN_METRICS:
+            residuals = points - centres[labels]
+            if self._sample_weight is None:
+                return float(np.einsum('ij,ij->', residuals, residuals))
+            sqr_dists = np.einsum('ij,ij->i', residuals, residuals)
+        else:
+            sqr_dists = _pairedDistances(
+                _metricKernel(self._metric), points, centres, labels
+            ) ** 2
+        if self._sample_weight is None:
+            return float(sqr_dists.sum(dtype=np.float64))
+        return float(np.einsum('i,i->', sqr_dists, self._sample_weight))
+
+    def _labelPoints(self, means: np.ndarray, points: np.ndarray) -> np.ndarray:
+        """
+        Label each point with the index of its closest mean.
 
         Parameters
         ----------
         means : np.ndarray
-            The current list of cluster means.
-            Randomly chosen for first iteration.
-        data : np.ndarray
-            The data to be organized.
+            (K, >=ndim) array of cluster means.
+        points : np.ndarray
+            (N, ndim) array of points to label, in the compute dtype.
 
         Returns
         -------
-        clusters : dictionary
+        labels : np.ndarray
+            (N,) integer array; labels[i] is the index of the mean
+            closest to points[i]. Ties go to the lower index.
+        """
+        means = np.asarray(means, dtype=self._dtype)[:, :self.ndim]
+        return np.argmin(
+            _metricKernel(self._metric, ordering=True)(points, means), axis=1
+        )
 
+    @staticmethod
+    def _pairwiseDistances(points: np.ndarray, means: np.ndarray) -> np.ndarray:
         """
-        # Organizes the data into clusters based on which mean
-        # is closest to a given point.
-        K_NUM = self._segments
-        clusters = {k: [] for k in range(K_NUM)}
-        index = None
-        ndim = self.ndim
+        Calculate the (N, K) matrix of squared Euclidean distances between
+        every point and every mean in one operation.
 
-        for point in data:
-            # Initialize ridiculously high number to begin comparisons.
-            curr_dist = 1E1000
-            for i in range(K_NUM):
-                new_dist = self._calcDistance(point[0:ndim], means[i][0:ndim])
+        Squared distances keep the same ordering as the true distances, so
+        they are all that is needed to find the closest mean.
+        """
+        diff = points[:, np.newaxis, :] - means[np.newaxis, :, :]
+        return np.einsum('ijk,ijk->ij', diff, diff)
 
-                if new_dist < curr_dist:
-                    # Track index of the closest mean point
-                    (curr_dist, index) = (new_dist, i)
-            else:
-                # Add entire point to label bin (all dimensions; not just ndim)
-                clusters[index].append(point)
-        return clusters
+    @staticmethod
+    def _asPoints(data, ndim: int, dtype=np.float64) -> np.ndarray:
+        """
+        Return the first `ndim` components of each data point as a
+        contiguous (N, ndim) array of `dtype` (no copy if `data` already
+        is one).
+        """
+        if isinstance(data, np.ndarray) and data.ndim == 2:
+            return np.ascontiguousarray(data[:, :ndim], dtype=dtype)
+        return np.array([arr[:ndim] for arr in data], dtype=dtype)
 
     @staticmethod
-    def _calcDistance(point1: np.ndarray, point2: np.ndarray = None):
+    def _asArray(data) -> np.ndarray:
+        """
+        Return the data as a 2D array (no copy if it already is one).
+        Rows of unequal length are cut to the length of the shortest row.
+        """
+        if isinstance(data, np.ndarray) and data.ndim == 2:
+            return data
+        try:
+            rows = np.array(data)
+        except ValueError:
+            rows = None
+        if rows is None or rows.ndim != 2 or rows.dtype == object:
+            if not len(data):
+                raise ValueError("Data must not be empty.")
+            length = min(len(x) for x in data)
+            rows = np.array([row[:length] for row in data])
+        if rows.ndim != 2:
+            raise ValueError("Data *must* be w/in a 1-D container.\nEx. "
+                             "[(0, 0), (2,3)]")
+        return rows
+
+    def _findCentroids(
+            self,
+            points: np.ndarray,
+            labels: np.ndarray,
+            means: np.ndarray
+    ) -> tuple:
         """
-        Calculate Euclidean distance between two points.
+        Calculate the centroid for each cluster.
 
         Parameters
         ----------
-        point1 : np.ndarray
-        point2 : np.ndarray, optional
-            Defaults to the zero vector.
+        points : np.ndarray
+            (N, ndim) array of the clustered points.
+        labels : np.ndarray
+            (N,) cluster label of each point.
+        means : np.ndarray
+            (K, ndim) means used to label the points. A cluster that
+            received no points (or no weight) keeps its mean.
 
         Returns
         -------
-        distance : np.float64
+        centroids : np.ndarray
+            (K, ndim) array of the (weighted) centroids of each cluster
+        counts : np.ndarray
+            (K,) number of points in each cluster
+        """
+        sums = _clusterSums(points, labels, self._segments, self._sample_weight)
+        return self._meanCentroids(*sums, means)
 
+    @staticmethod
+    def _meanCentroids(
+            sums: np.ndarray,
+            totals: np.ndarray,
+            counts: np.ndarray,
+            means: np.ndarray
+    ) -> tuple:
+        """
+        Centroids from per-cluster coordinate sums and (weight) totals
+        (see `_findCentroids`).
         """
-        # check input
-        this_func = 'KMeans._calcDistance'
-        if point2 is None:
-            point2 = np.zeros(len(point1))
+        centroids = np.array(means, copy=True)
+        filled = totals > 0
+        centroids[filled] = sums[filled] / totals[filled, np.newaxis]
+        return centroids, counts
 
-        try:
-            assert len(point1) == len(point2)
-        except AssertionError:
-            print(
-                (f'\n<{this_func}>: Both points must have same dimension.\n'
-                 f'Point 1: {point1}\nPoint 2: {point2}')
+
+class ClusterResult:
+    """
+    The output of a KMeans clustering operation.
+
+    The clustered data is not copied into per-cluster containers. Instead,
+    each cluster is available as a view of row indices into `data`
+    (see `indices`), and its points can be gathered on demand
+    (see `points`).
+
+    Attributes
+    ----------
+    data : np.ndarray
+        (N, M) array of the clustered data (all columns).
+    labels : np.ndarray
+        (N,) cluster index of each data point.
+    centroids : np.ndarray
+        (K, ndim) centroid of each cluster.
+    counts : np.ndarray
+        (K,) number of points in each cluster.
+    inertia : float
+        Sum of squared distances from each point to its cluster centroid.
+    iterations : int
+        Number of iterations the clustering operation ran.
+    distance_count : int
+        Number of point-mean distances computed while clustering.
+    converged : bool
+        False if the iteration limit stopped the clustering operation.
+    """
+
+    def __init__(
+            self,
+            data: np.ndarray,
+            labels: np.ndarray,
+            centroids: np.ndarray,
+            counts: np.ndarray,
+            inertia: float,
+            iterations: int,
+            distance_count: int = 0,
+            converged: bool = True
+    ):
+        self.data = data
+        self.labels = labels
+        self.centroids = centroids
+        self.counts = counts
+        self.inertia = inertia
+        self.iterations = iterations
+        self.distance_count = distance_count
+        self.converged = converged
+
+        # Row indices sorted by label and the bounds of each cluster within
+        # them; computed on first use.
+        self._order = None
+        self._offsets = None
+
+    def __len__(self):
+        return len(self.centroids)
+
+    @property
+    def segments(self) -> int:
+        """Number of clusters."""
+        return len(self.centroids)
+
+    @property
+    def clusters(self) -> dict:
+        """Map of each cluster index to its row indices (see `indices`)."""
+        return {k: self.indices(k) for k in range(self.segments)}
+
+    def indices(self, k: int) -> np.ndarray:
+        """
+        Row indices of the data points in cluster `k`, in ascending order.
+        The returned array is a read-only view; it is not copied per call.
+        """
+        if self._order is None:
+            order = np.argsort(self.labels, kind='stable')
+            order.flags.writeable = False
+            self._order = order
+            self._offsets = np.concatenate(([0], np.cumsum(self.counts)))
+        return self._order[self._offsets[k]:self._offsets[k + 1]]
+
+    def points(self, k: int) -> np.ndarray:
+        """The data points (all columns) in cluster `k`."""
+        return self.data[self.indices(k)]
+
+
+class IterationInfo(NamedTuple):
+    """Statistics of one KMeans iteration, as given to an observer."""
+    iteration: int
+    wall_time: float  # seconds spent on the iteration
+    inertia: float    # sum of squared point-mean distances after labeling
+    max_shift: float  # largest distance a centroid moved
+    n_changed: int    # points whose label changed (all, on iteration 1)
+
+
+class IterationRecorder:
+    """
+    KMeans observer that keeps every IterationInfo in `history`.
+    Optionally also passes each one to `callback` (ex. a logging function).
+    """
+
+    def __init__(self, callback=None):
+        self.history = []
+        self.callback = callback
+
+    def __call__(self, info: IterationInfo):
+        self.history.append(info)
+        if self.callback is not None:
+            self.callback(info)
+
+    def clear(self):
+        self.history.clear()
+
+    @property
+    def total_time(self) -> float:
+        """Wall time of all recorded iterations."""
+        return sum(info.wall_time for info in self.history)
+
+
+class MiniBatchKMeans:
+    """
+    Mini-batch k-Means for data too large to iterate over in full.
+
+    Instead of assigning every point each iteration, the centroids are
+    updated from small random batches. Each centroid has its own learning
+    rate of 1/(points seen by that centroid), so its updates shrink as it
+    settles.
+
+    Fitting
+    -------
+    `fit` accepts either
+        * an (N, M) array, from which up to `maxIterations` random batches
+          of `batch_size` rows are drawn (stopping early once no centroid
+          moves more than `threshold` in a batch), or
+        * any iterable of (n, M) chunks (ex. a generator that loads one
+          image at a time). Each chunk is shuffled and consumed in batches,
+          so only one chunk is held in memory at a time.
+    `partial_fit` updates the centroids from one batch. Once fitted,
+    `predict` and `transform` work as in KMeans.
+
+    The first batch (or chunk) seeds the centroids with `init`
+    (see KMeans).
+    """
+
+    def __init__(
+            self,
+            segments=2,
+            *,
+            ndim=0,
+            batch_size=1024,
+            init='k-means++',
+            seed=None,
+            threshold=1e-3,
+            maxIterations=100
+    ):
+        if segments < 1:
+            raise ValueError("Number of segments must be at least one.")
+        if batch_size < 1:
+            raise ValueError("Batch size must be at least one.")
+        if maxIterations < 1:
+            raise ValueError("Must have at least one iteration.")
+        if isinstance(init, str) and init not in INITIALIZERS:
+            raise ValueError(
+                f'Unknown initializer \'{init}\'. Use one of the '
+                f'following:\n{list(INITIALIZERS)}'
             )
-            raise
+        self.segments = segments
+        self.ndim = ndim
+        self.batch_size = batch_size
+        self.init = init
+        self.threshold = threshold
+        self.maxIterations = maxIterations
+        self._rng = check_random_state(seed)
+
+        self.centroids = None  # (K, ndim)
+        self.counts = None     # (K,) points seen by each centroid
+        self.iterations = 0    # batches processed
+        self.shift = np.inf    # largest centroid move in the last batch
+
+    def fit(self, data) -> 'MiniBatchKMeans':
+        """
+        Fit the centroids to an array or an iterable of chunks
+        (see class docstring). Returns this object.
+        """
+        if isinstance(data, np.ndarray):
+            rng = self._rng
+            for _ in range(self.maxIterations):
+                batch = data[rng.randint(len(data), size=self.batch_size)]
+                self.partial_fit(batch)
+                if self.shift <= self.threshold:
+                    break
+        else:
+            for chunk in data:
+                order = self._rng.permutation(len(chunk))
+                for start in range(0, len(chunk), self.batch_size):
+                    self.partial_fit(chunk[order[start:start + self.batch_size]])
+        return self
+
+    def partial_fit(self, batch) -> 'MiniBatchKMeans':
+        """Update the centroids from one batch of points. Returns this object."""
+        points = self._asPoints(batch)
+        if not len(points):
+            return self
+        K_NUM = self.segments
+        if self.centroids is None:
+            init = self.init
+            if isinstance(init, str):
+                init = INITIALIZERS[init]
+            if callable(init):
+                init = init(points, K_NUM, self._rng)
+            self.centroids = np.array(init, dtype=np.float64)[:, :self.ndim]
+            self.counts = np.zeros(K_NUM, dtype=np.int64)
+
+        labels = np.argmin(
+            KMeans._pairwiseDistances(points, self.centroids), axis=1
+        )
+        batch_counts = np.bincount(labels, minlength=K_NUM)
+        sums = np.stack(
+            [np.bincount(labels, weights=points[:, j], minlength=K_NUM)
+             for j in range(self.ndim)],
+            axis=1
+        )
+
+        # Moving each centroid toward each of its batch points in turn with
+        # rate 1/count is the same as this single weighted step.
+        filled = batch_counts > 0
+        self.counts += batch_counts
+        step = (
+            sums[filled]
+            - batch_counts[filled, np.newaxis] * self.centroids[filled]
+        ) / self.counts[filled, np.newaxis]
+        self.centroids[filled] += step
+        self.shift = float(np.linalg.norm(step, axis=1).max())
+        self.iterations += 1
+        return self
+
+    def predict(self, data, chunk_size=None) -> np.ndarray:
+        """Label each row of `data` with the index of its closest centroid."""
+        return nearest_centroids(
+            data, self._fittedCentroids(), chunk_size=chunk_size,
+            dtype=np.float64
+        )
+
+    def transform(self, data, chunk_size=None) -> np.ndarray:
+        """Distance from each row of `data` to every centroid."""
+        return centroid_distances(
+            data, self._fittedCentroids(), chunk_size=chunk_size,
+            dtype=np.float64
+        )
+
+    def _fittedCentroids(self) -> np.ndarray:
+        if self.centroids is None:
+            raise RuntimeError("MiniBatchKMeans must be fitted before predicting.")
+        return self.centroids
+
+    def _asPoints(self, batch) -> np.ndarray:
+        """Cast a batch to float64 and keep the first `ndim` columns."""
+        batch = np.asarray(batch)
+        if batch.ndim != 2:
+            raise ValueError("Batches must be 2D arrays (one point per row).")
+        if not self.ndim:
+            self.ndim = batch.shape[1]
+        return np.asarray(batch[:, :self.ndim], dtype=np.float64)
+
+
+class OutOfCoreKMeans:
+    """
+    k-Means over data too large for memory (ex. pixels pooled from many
+    saved .npy arrays), with the same iterations as KMeans.cluster.
+
+    The data is never loaded whole. Every iteration streams `chunk_size`
+    rows at a time through the nearest-centroid assignment and adds each
+    chunk's per-cluster coordinate sums and counts to running float64
+    totals, so memory use depends on `chunk_size` and k only. Labels are
+    not kept; get them afterwards with `predict` (one source at a time).
+
+    Data
+    ----
+    `fit` accepts one array or a sequence of arrays and/or .npy paths.
+    Paths are opened with np.load(mmap_mode='r'), and np.memmap arrays are
+    read in place. Arrays of more than two dimensions are treated as rows
+    of their last dimension (ex. (H, W, 3) images become (H*W, 3) pixels).
+
+    The initial means are chosen with `init` (see KMeans) from
+    `sample_size` rows drawn uniformly from all sources.
+    """
+
+    def __init__(
+            self,
+            segments=2,
+            *,
+            ndim=0,
+            chunk_size=None,
+            sample_size=10000,
+            init='k-means++',
+            seed=None,
+            threshold=1e-3,
+            maxIterations=100,
+            dtype=np.float32
+    ):
+        chunk_size = chunk_size or PREDICT_CHUNK_SIZE
+        if segments < 1:
+            raise ValueError("Number of segments must be at least one.")
+        if chunk_size < 1 or sample_size < segments:
+            raise ValueError(
+                "Chunk size must be at least one and the sample size at "
+                "least the number of segments."
+            )
+        if maxIterations < 1:
+            raise ValueError("Must have at least one iteration.")
+        if isinstance(init, str) and init not in INITIALIZERS:
+            raise ValueError(
+                f'Unknown initializer \'{init}\'. Use one of the '
+                f'following:\n{list(INITIALIZERS)}'
+            )
+        self.segments = segments
+        self.ndim = ndim
+        self.chunk_size = chunk_size
+        self.sample_size = sample_size
+        self.init = init
+        self.threshold = threshold
+        self.maxIterations = maxIterations
+        self.dtype = np.dtype(dtype)
+        self._rng = check_random_state(seed)
+
+        self.centroids = None  # (K, ndim)
+        self.counts = None     # (K,) points in each cluster
+        self.inertia = None    # w.r.t. the means of the last iteration
+        self.iterations = 0
+        self.converged = False
+
+    def fit(self, sources) -> 'OutOfCoreKMeans':
+        """Cluster the rows of every source (see class docstring)."""
+        sources = self._openSources(sources)
+        if not self.ndim:
+            self.ndim = sources[0].shape[1]
+        K_NUM, ndim = self.segments, self.ndim
+
+        means = self.init
+        if isinstance(means, str):
+            means = INITIALIZERS[means]
+        if callable(means):
+            means = means(self._sample(sources), K_NUM, self._rng)
+        means = np.array(np.asarray(means)[:, :ndim], dtype=self.dtype)
+
+        self.converged, self.iterations = False, 0
+        while self.iterations < self.maxIterations:
+            self.iterations += 1
+            sums = np.zeros((K_NUM, ndim))
+            counts = np.zeros(K_NUM, dtype=np.int64)
+            inertia = 0.0
+            for chunk in self._chunks(sources):
+                dists = KMeans._pairwiseDistances(chunk, means)
+                labels = np.argmin(dists, axis=1)
+                inertia += float(dists[np.arange(len(labels)), labels].sum(
+                    dtype=np.float64
+                ))
+                chunk_sums, _, chunk_counts = _clusterSums(chunk, labels, K_NUM)
+                sums += chunk_sums
+                counts += chunk_counts
+
+            centroids, _ = KMeans._meanCentroids(sums, counts, counts, means)
+            shifts = np.linalg.norm(centroids - means, axis=1)
+            means = centroids
+            if not np.any(shifts > self.threshold):
+                self.converged = True
+                break
+
+        self.centroids, self.counts, self.inertia = means, counts, inertia
+        return self
+
+    def predict(self, data, chunk_size=None) -> np.ndarray:
+        """Label each row of `data` with the index of its closest centroid."""
+        if self.centroids is None:
+            raise RuntimeError("OutOfCoreKMeans must be fitted before predicting.")
+        data = self._openSources([data])[0]
+        return nearest_centroids(
+            data, self.centroids, chunk_size=chunk_size or self.chunk_size,
+            dtype=self.dtype
+        )
 
-        # Cast as numpy arrays to prevent overflow
-        point1 = point1.astype(np.float64)
-        point2 = point2.astype(np.float64)
+    @staticmethod
+    def _openSources(sources) -> list:
+        """Return the sources as a list of (n, M) arrays, memory-mapping paths."""
+        if isinstance(sources, (np.ndarray, str, os.PathLike)):
+            sources = [sources]
+        arrays = []
+        for source in sources:
+            if isinstance(source, (str, os.PathLike)):
+                source = np.load(source, mmap_mode='r')
+            if source.ndim > 2:
+                # A view for contiguous (ex. memory-mapped) arrays.
+                source = source.reshape(-1, source.shape[-1])
+            elif source.ndim != 2:
+                raise ValueError("Each source must hold one point per row.")
+            arrays.append(source)
+        if not arrays:
+            raise ValueError("No data to cluster.")
+        return arrays
+
+    def _chunks(self, sources: list):
+        """Yield every source's rows as (<=chunk_size, ndim) compute arrays."""
+        for source in sources:
+            for chunk in iter_chunks(source, self.chunk_size):
+                yield KMeans._asPoints(chunk, self.ndim, self.dtype)
+
+    def _sample(self, sources: list) -> np.ndarray:
+        """Draw up to `sample_size` rows uniformly from all sources."""
+        sizes = np.array([len(source) for source in sources])
+        offsets = np.concatenate(([0], np.cumsum(sizes)))
+        total = int(offsets[-1])
+        # Drawn with replacement (no permutation of every row); repeats are
+        # dropped.
+        rows = np.unique(self._rng.randint(total, size=self.sample_size))
+        # Sorted rows read each memory-mapped source front to back.
+        owner = np.searchsorted(offsets, rows, side='right') - 1
+        return np.concatenate([
+            KMeans._asPoints(
+                source[rows[owner == s] - offsets[s]], self.ndim, self.dtype
+            )
+            for s, source in enumerate(sources)
+        ])
 
-        # Perform Calculation
-        return np.linalg.norm(point1 - point2)
 
-    def _findCentroids(self, clusters: dict):
+class WarmStartKMeans:
+    """
+    Clusters a sequence of related batches (ex. successive detection
+    batches of the same scene), starting each batch from the centroids
+    of the previous one so it converges in few iterations.
+
+    Each centroid has an age: the number of consecutive batches in which
+    its cluster held fewer than `min_count` points. Centroids older than
+    `max_age` are dropped. Missing centroids are filled in from the
+    batch's cold-start means, choosing the ones farthest from the kept
+    centroids.
+
+    If the warm-started result fits the batch much worse than the last one
+    (RMS point-centroid distance, in the units of the metric, more than
+    `reset_ratio` times the previous one or `rms_floor`, whichever is
+    larger), the scene is assumed to have changed and the batch is
+    re-clustered from its cold-start means. By default, `rms_floor` is the
+    KMeans threshold for the coordinate metrics ('euclidean',
+    'sqeuclidean', 'centre'), whose distances share its units, and 0 for
+    the others (ex. 'iou', in 1 - IoU units); set it explicitly for those.
+
+    `predict` and `transform` compare new rows with the centroids of the
+    last batch (ex. to classify fresh detections before the next batch is
+    clustered).
+
+    Any other keyword arguments are passed to KMeans.
+    """
+
+    def __init__(
+            self,
+            *,
+            max_age=3,
+            min_count=1,
+            reset_ratio=2.0,
+            rms_floor=None,
+            **kmeans_kwargs
+    ):
+        self.max_age = max_age
+        self.min_count = min_count
+        self.reset_ratio = reset_ratio
+        if rms_floor is None:
+            metric = kmeans_kwargs.get('metric', 'euclidean')
+            coordinate = isinstance(metric, str) and metric != 'iou'
+            rms_floor = kmeans_kwargs.get('threshold', 0.5) \
+                if coordinate else 0.0
+        self.rms_floor = rms_floor
+        self.kmeans_kwargs = kmeans_kwargs
+        self.cold_starts = 0
+        self.reset()
+
+    def reset(self):
+        """Forget the previous centroids; the next batch starts cold."""
+        self.centroids = None
+        self.ages = None
+        self._counts = None
+        self._rms = None
+
+    def cluster(
+            self,
+            data,
+            segments: int,
+            cold_means: np.ndarray
+    ) -> ClusterResult:
         """
-        Calculate the centroid for each cluster in the bin.
+        Cluster one batch.
+
         Parameters
         ----------
-        clusters: dict
-            The clustered data.
+        data : np.ndarray
+            The batch of data (see KMeans).
+        segments : int
+            Number of clusters for this batch.
+        cold_means : np.ndarray
+            (segments, >=ndim) unique initial means among the data, used
+            for a cold start and to fill in missing centroids. They are
+            trusted, not checked (see KMeans.from_array).
 
         Returns
         -------
-        centroids : list
-            - List of the centroids of each cluster
-
-        """
-        # Calculate the centroid for each cluster in the bin.
-        # Takes in any iterable, but seeing as the data is labeled,
-        # it should be a dictionary whose keys range from 0 to some n.
-        # However, I'm leaving it to work for more iterables in case I need to
-        # change the design in the future.
-
-        centroids = []
-        for cluster in clusters.values():
-            temp = [arr[:self.ndim] for arr in cluster]
-            cluster = np.array(temp, dtype=np.float64)
-            rows = cluster.shape[0]
-            # Calc centroid
-            centroid = cluster[:, 0:self.ndim].sum(axis=0)/rows
-            centroids.append(centroid)
-        return centroids
-# ---
+        ClusterResult
+        """
+        kwargs = dict(self.kmeans_kwargs, segments=segments)
+        data = KMeans._asArray(data)
+        cold_means = np.asarray(cold_means)
+
+        result, warm_means = None, self._warmMeans(segments, cold_means)
+        if warm_means is not None:
+            means, ages = warm_means
+            result = KMeans.from_array(data, init=means, **kwargs).cluster()
+            rms = np.sqrt(result.inertia / len(result.labels))
+            if rms > self.reset_ratio * max(self._rms, self.rms_floor):
+                result = None  # scene changed
+        if result is None:
+            self.cold_starts += 1
+            result = KMeans.from_array(
+                data, initial_means=cold_means, **kwargs
+            ).cluster()
+            ages = np.zeros(segments, dtype=int)
+
+        # Age the centroids and remember them for the next batch.
+        self.ages = np.where(result.counts >= self.min_count, 0, ages + 1)
+        self.centroids = result.centroids
+        self._counts = result.counts
+        self._rms = np.sqrt(result.inertia / len(result.labels))
+        return result
+
+    def predict(self, data, chunk_size=None) -> np.ndarray:
+        """Label each row of `data` with its closest last-batch centroid."""
+        return nearest_centroids(
+            data, self._fittedCentroids(), chunk_size=chunk_size,
+            dtype=self.kmeans_kwargs.get('dtype', np.float32),
+            metric=self.kmeans_kwargs.get('metric', 'euclidean')
+        )
+
+    def transform(self, data, chunk_size=None) -> np.ndarray:
+        """
+        Distance (in the KMeans metric) from each row of `data` to every
+        last-batch centroid.
+        """
+        return centroid_distances(
+            data, self._fittedCentroids(), chunk_size=chunk_size,
+            dtype=self.kmeans_kwargs.get('dtype', np.float32),
+            metric=self.kmeans_kwargs.get('metric', 'euclidean')
+        )
+
+    def _fittedCentroids(self) -> np.ndarray:
+        if self.centroids is None:
+            raise RuntimeError("No batch has been clustered yet.")
+        return self.centroids
+
+    def _warmMeans(self, segments: int, cold_means: np.ndarray):
+        """
+        Return the (segments, ndim) warm-start means and their ages, or None
+        if there is nothing to warm start from.
+        """
+        if self.centroids is None:
+            return None
+        ndim = self.centroids.shape[1]
+        keep = np.flatnonzero(self.ages <= self.max_age)
+        if not keep.size:
+            return None
+
+        # Youngest (then most populated) centroids first.
+        order = np.lexsort((-self._counts[keep], self.ages[keep]))
+        keep = keep[order][:segments]
+        means, ages = self.centroids[keep], self.ages[keep]
+
+        missing = segments - len(means)
+        if missing:
+            cold = np.asarray(cold_means[:, :ndim], dtype=means.dtype)
+            gaps = KMeans._pairwiseDistances(cold, means).min(axis=1)
+            fill = np.argsort(-gaps, kind='stable')[:missing]
+            means = np.concatenate((means, cold[fill]))
+            ages = np.concatenate((ages, np.zeros(missing, dtype=int)))
+        if len(np.unique(means, axis=0)) != segments:
+            return None
+        return means, ages
+
+
+def _clusterRestarts(kmeans: KMeans, seeds: np.ndarray) -> ClusterResult:
+    """
+    Process-pool entry point for a share of the KMeans restarts (see
+    KMeans.cluster); returns the one with the lowest inertia.
+    """
+    points = kmeans._asPoints(kmeans._data, kmeans.ndim, kmeans._dtype)
+    results = [
+        kmeans._clusterOnce(points, np.random.RandomState(seed))
+        for seed in seeds
+    ]
+    result = min(results, key=lambda result: result.inertia)
+    result.data = None  # the parent process re-attaches its own copy
+    return result
+
+
+def cluster_batch(
+        data: np.ndarray,
+        offsets,
+        initial_means,
+        *,
+        ndim=0,
+        threshold=0.5,
+        maxIterations=100,
+        dtype=np.float32
+) -> list:
+    """
+    Cluster many independent problems at once (ex. every detection batch
+    of a recorded session), each with its own k and initial means.
+
+    All problems are solved together: each point is compared only with
+    the means of its own problem through a (points, max k) distance array,
+    and centroids are summed for every problem with one bincount per
+    dimension. A problem stops changing once it converges (same criterion
+    as KMeans.cluster), so each result matches a separate KMeans run.
+
+    Parameters
+    ----------
+    data : np.ndarray
+        (T, M) array of every problem's data, one problem after another.
+    offsets : array_like
+        (P + 1,) row offsets; problem p is data[offsets[p]:offsets[p + 1]].
+    initial_means : list
+        P arrays of shape (k_p, >=ndim), the initial means of each problem.
+        The number of rows sets each problem's k.
+    ndim : int, optional
+        Number of columns to cluster on. Defaults to all of them.
+    threshold : float, optional
+    maxIterations : int, optional
+    dtype : np.dtype, optional
+        See KMeans.
+
+    Returns
+    -------
+    list
+        One ClusterResult per problem.
+    """
+    data = np.asarray(data)
+    offsets = np.asarray(offsets, dtype=np.intp)
+    ndim = ndim or data.shape[1]
+    n_problems = len(offsets) - 1
+    if n_problems < 1 or offsets[0] != 0 or offsets[-1] != len(data) \
+            or np.any(np.diff(offsets) < 1):
+        raise ValueError(
+            "Offsets must start at 0, end at len(data), and give each "
+            "problem at least one point."
+        )
+    if len(initial_means) != n_problems:
+        raise ValueError("Need one set of initial means per problem.")
+    if maxIterations < 1:
+        raise ValueError("Must have at least one iteration.")
+
+    points = np.ascontiguousarray(data[:, :ndim], dtype=dtype)
+    sizes = np.diff(offsets)
+    point_problem = np.repeat(np.arange(n_problems), sizes)
+
+    # Means are stored flat; mean_offsets[p] is problem p's first mean.
+    ks = np.array([len(m) for m in initial_means], dtype=np.intp)
+    if np.any(ks < 1) or np.any(ks > sizes):
+        raise ValueError(
+            "Each problem needs between one and (number of points) means."
+        )
+    mean_offsets = np.concatenate(([0], np.cumsum(ks)))
+    total_k, max_k = int(mean_offsets[-1]), int(ks.max())
+    means = np.concatenate(
+        [np.asarray(m, dtype=dtype)[:, :ndim] for m in initial_means]
+    )
+    mean_problem = np.repeat(np.arange(n_problems), ks)
+
+    # (P, max k) slot -> flat mean index; padded slots point at a dummy
+    # mean of infinities so they are never the closest.
+    slots = np.full((n_problems, max_k), total_k, dtype=np.intp)
+    slot_cols = np.arange(total_k) - mean_offsets[mean_problem]
+    slots[mean_problem, slot_cols] = np.arange(total_k)
+
+    labels = np.zeros(len(points), dtype=np.intp)  # flat mean index
+    counts = np.zeros(total_k, dtype=np.int64)
+    iterations = np.zeros(n_problems, dtype=int)
+    distance_count = np.zeros(n_problems, dtype=np.int64)
+    active = np.ones(n_problems, dtype=bool)
+    padded = np.vstack((means, np.full((1, ndim), np.inf, dtype=dtype)))
+
+    for _ in range(maxIterations):
+        iterations[active] += 1
+        distance_count[active] += sizes[active] * ks[active]
+        rows = np.flatnonzero(active[point_problem])
+        row_slots = slots[point_problem[rows]]  # (n, max k)
+
+        diff = points[rows, np.newaxis, :] - padded[row_slots]
+        dists = np.einsum('ijk,ijk->ij', diff, diff)
+        labels[rows] = row_slots[np.arange(len(rows)), np.argmin(dists, axis=1)]
+
+        # Centroids of the active problems' clusters.
+        row_labels = labels[rows]
+        new_counts = np.bincount(row_labels, minlength=total_k)
+        sums = np.stack(
+            [np.bincount(row_labels, weights=points[rows, j],
+                         minlength=total_k) for j in range(ndim)],
+            axis=1
+        )
+        updated = (new_counts > 0) & active[mean_problem]
+        centroids = padded[:-1].copy()
+        centroids[updated] = sums[updated] / new_counts[updated, np.newaxis]
+        counts[active[mean_problem]] = new_counts[active[mean_problem]]
+
+        # A problem converges when none of its means moved over threshold.
+        shifts = np.linalg.norm(centroids - padded[:-1], axis=1)
+        moved = np.bincount(
+            mean_problem, weights=(shifts > threshold), minlength=n_problems
+        )
+        padded[:-1] = centroids
+        active &= moved > 0
+        if not active.any():
+            break
+
+    residuals = points - padded[labels]
+    inertia = np.bincount(
+        point_problem,
+        weights=np.einsum('ij,ij->i', residuals, residuals),
+        minlength=n_problems
+    )
+    results = []
+    for p in range(n_problems):
+        start, stop = offsets[p], offsets[p + 1]
+        m_start, m_stop = mean_offsets[p], mean_offsets[p + 1]
+        results.append(ClusterResult(
+            data=data[start:stop],
+            labels=labels[start:stop] - m_start,
+            centroids=padded[m_start:m_stop],
+            counts=counts[m_start:m_stop],
+            inertia=float(inertia[p]),
+            iterations=int(iterations[p]),
+            distance_count=int(distance_count[p]),
+            converged=not active[p]
+        ))
+    return results
+
+
+def unique_rows(data: np.ndarray) -> tuple:
+    """
+    The distinct rows of a 2D array, the index of each row's distinct row
+    (so unique[inverse] == data), and how often each distinct row occurs.
+    Rows are compared as raw bytes, which is much faster than
+    np.unique(axis=0); the order of the distinct rows is unspecified.
+    """
+    rows = np.ascontiguousarray(data)
+    if rows.dtype.kind == 'f':
+        rows = rows + rows.dtype.type(0)  # -0.0 -> 0.0
+    keys = rows.view(np.dtype((np.void, rows.itemsize * rows.shape[1])))
+    _, index, inverse, counts = np.unique(
+        keys.ravel(), return_index=True, return_inverse=True,
+        return_counts=True
+    )
+    return rows[index], inverse.ravel(), counts
+
+
+def cluster_unique(data, *, ndim=0, sample_weight=None, **kwargs) -> ClusterResult:
+    """
+    Cluster data with many duplicate rows (ex. the pixels of an image) by
+    clustering only its distinct rows, each weighted by how often it occurs
+    (times its own `sample_weight`, if given). The work per iteration
+    shrinks by the duplication factor; the result is the same as
+    clustering every row.
+
+    Parameters
+    ----------
+    data : np.ndarray
+        (N, >=ndim) data (see KMeans).
+    ndim : int, optional
+        Number of columns to cluster on. Defaults to all of them.
+    sample_weight : np.ndarray, optional
+        (N,) weight of each row.
+    **kwargs
+        Other keyword arguments of the KMeans constructor. `segments` may
+        not exceed the number of distinct rows.
+
+    Returns
+    -------
+    ClusterResult
+        For the full data: one label per row and the number of rows in
+        each cluster.
+    """
+    data = KMeans._asArray(data)
+    ndim = ndim or data.shape[1]
+    unique, inverse, counts = unique_rows(data[:, :ndim])
+    if sample_weight is None:
+        weights = counts
+    else:
+        weights = np.bincount(
+            inverse, weights=np.asarray(sample_weight, dtype=np.float64),
+            minlength=len(unique)
+        )
+    result = KMeans.from_array(
+        unique, ndim=ndim, sample_weight=weights, **kwargs
+    ).cluster()
+
+    labels = result.labels[inverse]
+    return ClusterResult(
+        data=data,
+        labels=labels,
+        centroids=result.centroids,
+        counts=np.bincount(labels, minlength=result.segments),
+        inertia=result.inertia,
+        iterations=result.iterations,
+        distance_count=result.distance_count,
+        converged=result.converged
+    )
+
+
+def _clusterSums(
+        points: np.ndarray,
+        labels: np.ndarray,
+        segments: int,
+        weights: np.ndarray = None
+) -> tuple:
+    """
+    Per-cluster (weighted) coordinate sums, weight totals, and point counts
+    of labeled points. Sums use one bincount per dimension; bincount
+    accumulates in float64, which keeps float32 sums accurate. Without
+    weights, the totals are the counts.
+    """
+    counts = np.bincount(labels, minlength=segments)
+    if weights is None:
+        totals = counts
+        columns = [points[:, j] for j in range(points.shape[1])]
+    else:
+        totals = np.bincount(labels, weights=weights, minlength=segments)
+        columns = [points[:, j] * weights for j in range(points.shape[1])]
+    sums = np.stack(
+        [np.bincount(labels, weights=column, minlength=segments)
+         for column in columns],
+        axis=1
+    )
+    return sums, totals, counts
+
+
+def iter_chunks(data: np.ndarray, chunk_size: int):
+    """Yield successive row views of `data` with at most `chunk_size` rows."""
+    for start in range(0, len(data), chunk_size):
+        yield data[start:start + chunk_size]
+
+
+# Rows per chunk when predicting; bounds the (rows, K, ndim) temporary.
+PREDICT_CHUNK_SIZE = 1 << 16
+
+
+def nearest_centroids(
+        data,
+        centroids: np.ndarray,
+        *,
+        chunk_size=None,
+        dtype=np.float32,
+        metric='euclidean'
+) -> np.ndarray:
+    """
+    Label each row of `data` with the index of its closest centroid.
+
+    Parameters
+    ----------
+    data : array_like
+        (N, >=ndim) points; only the first ndim = centroids.shape[1]
+        columns are used.
+    centroids : np.ndarray
+        (K, ndim) centroids (ex. ClusterResult.centroids).
+    chunk_size : int, optional
+        Rows compared at a time. Defaults to PREDICT_CHUNK_SIZE.
+    dtype : np.dtype, optional
+        Compute dtype (see KMeans).
+    metric : str or callable, optional
+        Distance metric (see KMeans).
+
+    Returns
+    -------
+    np.ndarray
+        (N,) label of each row. Ties go to the lower index.
+    """
+    data, centroids = _predictArgs(data, centroids, dtype)
+    kernel = _metricKernel(metric, ordering=True)
+    labels = np.empty(len(data), dtype=np.intp)
+    for start, chunk in _predictChunks(data, centroids, chunk_size, dtype,
+                                       kernel):
+        labels[start:start + len(chunk)] = np.argmin(chunk, axis=1)
+    return labels
+
+
+def centroid_distances(
+        data,
+        centroids: np.ndarray,
+        *,
+        chunk_size=None,
+        dtype=np.float32,
+        metric='euclidean'
+) -> np.ndarray:
+    """
+    Distance (Euclidean by default) from each row of `data` to every
+    centroid. Parameters are as in `nearest_centroids`.
+
+    Returns
+    -------
+    np.ndarray
+        (N, K) array of `dtype`; [i, k] is the distance from row i to
+        centroid k.
+    """
+    data, centroids = _predictArgs(data, centroids, dtype)
+    kernel = _metricKernel(metric)
+    distances = np.empty((len(data), len(centroids)), dtype=dtype)
+    for start, chunk in _predictChunks(data, centroids, chunk_size, dtype,
+                                       kernel):
+        distances[start:start + len(chunk)] = chunk
+    return distances
+
+
+def _predictArgs(data, centroids, dtype) -> tuple:
+    """Validate and cast the arguments of the predict functions."""
+    centroids = np.asarray(centroids, dtype=dtype)
+    data = KMeans._asArray(data)
+    if centroids.ndim != 2 or data.shape[1] < centroids.shape[1]:
+        raise ValueError(
+            "Data rows must have at least as many components as the centroids."
+        )
+    return data, centroids
+
+
+def _predictChunks(data, centroids, chunk_size, dtype, kernel):
+    """Yield (start row, kernel(chunk points, centroids)) per chunk."""
+    chunk_size = chunk_size or PREDICT_CHUNK_SIZE
+    if chunk_size < 1:
+        raise ValueError("Chunk size must be at least one.")
+    ndim = centroids.shape[1]
+    for start in range(0, len(data), chunk_size):
+        points = KMeans._asPoints(data[start:start + chunk_size], ndim, dtype)
+        yield start, kernel(points, centroids)
+
+
+# ==================
+# Distance kernels
+# ==================
+"""
+A metric kernel takes (N, ndim) points and (K, ndim) means and returns the
+(N, K) matrix of point-mean distances in one vectorized call.
+"""
+
+
+def sqeuclidean_distances(points: np.ndarray, means: np.ndarray) -> np.ndarray:
+    """Squared Euclidean distances."""
+    return KMeans._pairwiseDistances(points, means)
+
+
+def euclidean_distances(points: np.ndarray, means: np.ndarray) -> np.ndarray:
+    """Euclidean distances."""
+    return np.sqrt(KMeans._pairwiseDistances(points, means))
+
+
+def centre_distances(points: np.ndarray, means: np.ndarray) -> np.ndarray:
+    """Euclidean distances between the centres of xyxy boxes."""
+    return euclidean_distances(_boxCentres(points), _boxCentres(means))
+
 
+def iou_distances(points: np.ndarray, means: np.ndarray) -> np.ndarray:
+    """1 - IoU (intersection over union) of xyxy boxes."""
+    p = points[:, np.newaxis, :4]
+    m = means[np.newaxis, :, :4]
+    width = np.minimum(p[..., 2], m[..., 2]) - np.maximum(p[..., 0], m[..., 0])
+    height = np.minimum(p[..., 3], m[..., 3]) - np.maximum(p[..., 1], m[..., 1])
+    inter = np.maximum(width, 0) * np.maximum(height, 0)
+    union = _boxAreas(points)[:, np.newaxis] + _boxAreas(means) - inter
+    # Degenerate (zero-area) pairs count as not overlapping at all.
+    iou = np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+    return 1 - iou
+
+
+def _boxCentres(boxes: np.ndarray) -> np.ndarray:
+    return 0.5 * (boxes[:, :2] + boxes[:, 2:4])
+
+
+def _boxAreas(boxes: np.ndarray) -> np.ndarray:
+    return np.maximum(boxes[:, 2] - boxes[:, 0], 0) \
+        * np.maximum(boxes[:, 3] - boxes[:, 1], 0)
+
+
+def _metricKernel(metric, ordering: bool = False):
+    """
+    The kernel of a metric name or callable. With `ordering`, a cheaper
+    kernel with the same nearest means may be returned (squared Euclidean
+    for Euclidean).
+    """
+    if not isinstance(metric, str):
+        return metric
+    if ordering and metric == 'euclidean':
+        return sqeuclidean_distances
+    return METRICS[metric]
+
+
+def _pairedDistances(kernel, points: np.ndarray, centres: np.ndarray,
+                     labels: np.ndarray) -> np.ndarray:
+    """kernel distance from each point to its own centre (one call per centre)."""
+    dists = np.empty(len(points), dtype=np.float64)
+    for k in range(len(centres)):
+        rows = np.flatnonzero(labels == k)
+        if rows.size:
+            dists[rows] = kernel(points[rows], centres[k:k + 1])[:, 0]
+    return dists
+
+
+METRICS = {
+    'euclidean': euclidean_distances,
+    'sqeuclidean': sqeuclidean_distances,
+    'centre': centre_distances,
+    'iou': iou_distances
+}
+_EUCLIDEAN_METRICS = ('euclidean', 'sqeuclidean')
+_BOX_METRICS = ('centre', 'iou')
+
+
+# ===================
+# Assignment engines
+# ===================
+"""
+Each engine is constructed once per clustering operation with the (N, ndim)
+points and is then called with the current (K, ndim) means every iteration,
+returning a fresh (N,) labels array. Engines may keep state between calls (e.g.
+distance bounds) and count the point-mean distances they compute in
+`distance_count`.
+"""
+
+
+class _LloydAssigner:
+    """
+    Brute force: compute all N x K distances every iteration, with any
+    metric (see METRICS).
+    """
+
+    def __init__(self, points: np.ndarray, metric='sqeuclidean'):
+        self.points = points
+        self.kernel = _metricKernel(metric, ordering=True)
+        self.distance_count = 0
+
+    def __call__(self, means: np.ndarray) -> np.ndarray:
+        self.distance_count += len(self.points) * len(means)
+        return np.argmin(self.kernel(self.points, means), axis=1)
+
+
+class _HamerlyAssigner:
+    """
+    Hamerly's algorithm: each point keeps an upper bound on the distance to
+    its own mean and one lower bound on the distance to every other mean.
+    Points whose upper bound is below the lower bound (or half the distance
+    from their mean to the nearest other mean) cannot change label and are
+    skipped.
+
+    The bounds are kept in float64 and tested with a margin for the
+    rounding of the 'lloyd' distances (see _roundingSlack), and labels are
+    recomputed with the 'lloyd' kernel, so near-ties break the same way.
+    """
+
+    def __init__(self, points: np.ndarray):
+        self.points = points
+        self.slack = _roundingSlack(points)
+        self.distance_count = 0
+        self.labels = None
+        self.upper = None
+        self.lower = None
+        self.prev_means = None
+
+    def __call__(self, means: np.ndarray) -> np.ndarray:
+        points = self.points
+        means64 = means.astype(np.float64)
+        if self.labels is None:
+            self.labels, self.upper, self.lower = _closestMeans(points, means)
+            self.distance_count += len(points) * len(means)
+            self.prev_means = means64
+            return self.labels.copy()
+
+        labels, upper, lower = self.labels, self.upper, self.lower
+
+        # Move the bounds by how far the means moved.
+        shifts = np.linalg.norm(means64 - self.prev_means, axis=1)
+        self.prev_means = means64
+        upper += shifts[labels]
+        if len(means) > 1:
+            # A point's lower bound covers every mean but its own, so its
+            # own mean's shift only matters if no other moved further.
+            top_two = np.argsort(shifts)[-2:]
+            largest, second = shifts[top_two[1]], shifts[top_two[0]]
+            lower -= np.where(labels == top_two[1], second, largest)
+
+        # Half the distance from each mean to its nearest neighbour.
+        half_gap = 0.5 * _nearestOtherMean(means64)
+        bound = self.slack * np.maximum(half_gap[labels], lower)
+
+        # Tighten the upper bound of points that fail the test.
+        active = np.flatnonzero(upper >= bound)
+        if not active.size:
+            return labels.copy()
+        upper[active] = np.linalg.norm(
+            points[active] - means64[labels[active]], axis=1
+        )
+        self.distance_count += active.size
+        active = active[upper[active] >= bound[active]]
+        if not active.size:
+            return labels.copy()
+
+        # Remaining points get a full distance computation.
+        labels[active], upper[active], lower[active] = _closestMeans(
+            points[active], means
+        )
+        self.distance_count += active.size * len(means)
+        return labels.copy()
+
+
+class _ElkanAssigner:
+    """
+    Elkan's algorithm: each point keeps an upper bound on the distance to
+    its own mean and a lower bound on the distance to every mean. Only the
+    point-mean pairs whose bounds leave the label in doubt are computed.
+
+    As in _HamerlyAssigner, the bounds are tested with a rounding margin,
+    and points whose closest means are within that margin of each other are
+    relabeled with the 'lloyd' kernel. The (N, K) lower bounds stay in the
+    points' dtype to save memory traffic; each update lowers them by an
+    extra `margin` (a few ulps of the data diameter) to absorb the rounding
+    of the update itself.
+    """
+
+    def __init__(self, points: np.ndarray):
+        self.points = points
+        self.slack = _roundingSlack(points)
+        centred = points - points.mean(axis=0)
+        diameter = 2 * np.sqrt(np.einsum('ij,ij->i', centred, centred).max())
+        self.margin = 2 * np.finfo(points.dtype).eps * diameter
+        self.distance_count = 0
+        self.labels = None
+        self.upper = None
+        self.lower = None
+        self.prev_means = None
+
+    def __call__(self, means: np.ndarray) -> np.ndarray:
+        points = self.points
+        means64 = means.astype(np.float64)
+        if self.labels is None:
+            sq_dists = KMeans._pairwiseDistances(points, means)
+            self.distance_count += sq_dists.size
+            self.labels = np.argmin(sq_dists, axis=1)
+            self.lower = np.sqrt(sq_dists)
+            self.upper = self.lower[np.arange(len(points)), self.labels] \
+                .astype(np.float64)
+            self.prev_means = means64
+            return self.labels.copy()
+
+        labels, upper, lower = self.labels, self.upper, self.lower
+        slack = self.slack
+
+        # Move the bounds by how far the means moved.
+        shifts = np.linalg.norm(means64 - self.prev_means, axis=1)
+        self.prev_means = means64
+        upper += shifts[labels]
+        lower -= (shifts + self.margin).astype(lower.dtype)
+        np.maximum(lower, 0, out=lower)
+
+        centre_dists = np.sqrt(KMeans._pairwiseDistances(means64, means64))
+        half_centre = 0.5 * centre_dists
+        np.fill_diagonal(centre_dists, np.inf)
+        half_gap = 0.5 * centre_dists.min(axis=1)
+
+        active = np.flatnonzero(upper >= slack * half_gap[labels])
+        if not active.size:
+            return labels.copy()
+
+        # Tighten the upper bounds of points with a candidate mean.
+        own = labels[active]
+        candidates = self._candidates(upper[active], lower[active],
+                                      half_centre[own], own, slack)
+        active = active[candidates.any(axis=1)]
+        if not active.size:
+            return labels.copy()
+        own = labels[active]
+        exact = np.linalg.norm(points[active] - means64[own], axis=1)
+        self.distance_count += active.size
+        upper[active] = exact
+        lower[active, own] = exact
+
+        # Compute the remaining candidate pairs and relabel.
+        candidates = self._candidates(upper[active], lower[active],
+                                      half_centre[own], own, slack)
+        rows, cols = np.nonzero(candidates)
+        if not rows.size:
+            return labels.copy()
+        pair_dists = np.linalg.norm(
+            points[active[rows]] - means64[cols], axis=1
+        )
+        self.distance_count += rows.size
+        lower[active[rows], cols] = pair_dists
+
+        dists = np.full(candidates.shape, np.inf)
+        dists[np.arange(len(active)), own] = exact
+        dists[rows, cols] = pair_dists
+        new_labels, closest, second = _closestTwo(dists)
+
+        # Near-ties: rank every mean as 'lloyd' does.
+        tied = second * slack <= closest
+        if tied.any():
+            tied_rows = active[tied]
+            sq_dists = KMeans._pairwiseDistances(points[tied_rows], means)
+            self.distance_count += sq_dists.size
+            lower[tied_rows] = np.sqrt(sq_dists)
+            new_labels[tied] = np.argmin(sq_dists, axis=1)
+            closest[tied] = lower[tied_rows, new_labels[tied]]
+        labels[active] = new_labels
+        upper[active] = closest
+        return labels.copy()
+
+    @staticmethod
+    def _candidates(upper, lower, half_centre, own, slack) -> np.ndarray:
+        """(n, K) mask of the means that could be closer than each point's own."""
+        reach = (upper / slack)[:, np.newaxis]
+        candidates = (reach >= lower) & (reach >= half_centre)
+        candidates[np.arange(len(own)), own] = False
+        return candidates
+
+
+class _KDTree:
+    """
+    A kd-tree over (N, ndim) points, built level by level with array
+    operations. Node `i` holds the rows start[i]:end[i] of `points`, the
+    points sorted into tree order (`order` maps them back), and the
+    tight bounding box lo[i], hi[i] of those rows. Each node is split at
+    the median of its widest dimension until it holds at most `leaf_size`
+    points; left[i] is -1 for leaves and right[i] = left[i] + 1.
+    """
+
+    def __init__(self, points: np.ndarray, leaf_size: int = 16):
+        n_points = len(points)
+        self.key = _arrayKey(points)
+        order = np.arange(n_points)
+        tree_points = points
+        # Per-level node ranges; ids are assigned breadth first.
+        starts, ends, los, his, lefts = [], [], [], [], []
+        level_start = np.array([0])
+        level_end = np.array([n_points])
+        next_id = 1
+        while level_start.size:
+            # Tight bounding boxes via reductions over each node's rows.
+            bounds = np.column_stack((level_start, level_end)).ravel()
+            padded = np.vstack((tree_points, tree_points[-1:]))
+            lo = np.minimum.reduceat(padded, bounds, axis=0)[::2]
+            hi = np.maximum.reduceat(padded, bounds, axis=0)[::2]
+
+            split = (level_end - level_start) > leaf_size
+            left = np.full(len(level_start), -1, dtype=np.intp)
+            left[split] = next_id + 2 * np.arange(np.count_nonzero(split))
+            next_id += 2 * np.count_nonzero(split)
+            starts.append(level_start)
+            ends.append(level_end)
+            los.append(lo)
+            his.append(hi)
+            lefts.append(left)
+            if not split.any():
+                break
+
+            # Sort the rows of every split node along its widest dimension.
+            s_start, s_end = level_start[split], level_end[split]
+            # (One argsort of node + key scaled into [0, 0.5] is much faster
+            # than a lexsort on both.)
+            spans = hi[split] - lo[split]
+            dims = np.argmax(spans, axis=1)
+            width = spans[np.arange(len(dims)), dims]
+            width[width == 0] = 1
+            rows = _concatRanges(s_start, s_end)
+            node_of_row = np.repeat(np.arange(len(s_start)), s_end - s_start)
+            row_dims = dims[node_of_row]
+            keys = (tree_points[rows, row_dims] - lo[split][node_of_row, row_dims]) \
+                / (2.0 * width[node_of_row])
+            rows = rows[np.argsort(node_of_row + keys)]
+            tree_points = tree_points.copy() if tree_points is points \
+                else tree_points
+            idx = _concatRanges(s_start, s_end)
+            tree_points[idx] = tree_points[rows]
+            order[idx] = order[rows]
+
+            middle = s_start + (s_end - s_start) // 2
+            level_start = np.column_stack((s_start, middle)).ravel()
+            level_end = np.column_stack((middle, s_end)).ravel()
+
+        self.points = tree_points
+        self.order = order
+        self.start = np.concatenate(starts)
+        self.end = np.concatenate(ends)
+        self.lo = np.concatenate(los)
+        self.hi = np.concatenate(his)
+        self.left = np.concatenate(lefts)
+
+
+class _KDTreeAssigner:
+    """
+    Kanungo et al.'s filtering algorithm. The tree is walked one level at a
+    time, each node with the means that could still be closest to some
+    point in its bounding box. A mean is dropped from a node when it is
+    farther than the mean closest to the box midpoint from every corner of
+    the box (checked at the one corner that matters). Nodes left with a
+    single mean are labeled whole; leaves with several compare their points
+    with those means only. Labels match 'lloyd'.
+
+    Pays off for low-dimensional data (ex. 4D boxes) with many points per
+    cluster. Pass a prebuilt `tree` to reuse it across clustering runs.
+    """
+
+    def __init__(self, points: np.ndarray, tree: _KDTree = None):
+        self.points = points
+        self.tree = tree if tree is not None else _KDTree(points)
+        self.distance_count = 0
+
+    def __call__(self, means: np.ndarray) -> np.ndarray:
+        tree = self.tree
+        K_NUM = len(means)
+        tree_labels = np.empty(len(self.points), dtype=np.intp)
+        nodes = np.array([0])
+        candidates = np.ones((1, K_NUM), dtype=bool)
+
+        while nodes.size:
+            lo, hi = tree.lo[nodes], tree.hi[nodes]
+            self.distance_count += int(candidates.sum())
+            if K_NUM > 1:
+                # Closest candidate to each node's midpoint.
+                mid_dists = KMeans._pairwiseDistances(0.5 * (lo + hi), means)
+                best = np.argmin(np.where(candidates, mid_dists, np.inf), axis=1)
+                # Mean z loses to z* everywhere in the box iff it does so at
+                # the corner farthest in the direction z - z*.
+                toward = means[np.newaxis, :, :] - means[best][:, np.newaxis, :]
+                corner = np.where(toward > 0, hi[:, np.newaxis, :],
+                                  lo[:, np.newaxis, :])
+                to_mean = corner - means[np.newaxis, :, :]
+                to_best = corner - means[best][:, np.newaxis, :]
+                candidates &= ~(
+                    np.einsum('ijk,ijk->ij', to_mean, to_mean)
+                    > np.einsum('ijk,ijk->ij', to_best, to_best)
+                )
+
+            n_left = candidates.sum(axis=1)
+            start, end = tree.start[nodes], tree.end[nodes]
+
+            # Nodes with one candidate are labeled whole.
+            done = n_left == 1
+            if done.any():
+                tree_labels[_concatRanges(start[done], end[done])] = np.repeat(
+                    np.argmax(candidates[done], axis=1),
+                    end[done] - start[done]
+                )
+
+            # Leaves with several candidates compare each point with them.
+            is_leaf = tree.left[nodes] < 0
+            brute = ~done & is_leaf
+            if brute.any():
+                rows = _concatRanges(start[brute], end[brute])
+                mask = np.repeat(candidates[brute], end[brute] - start[brute],
+                                 axis=0)
+                dists = KMeans._pairwiseDistances(tree.points[rows], means)
+                self.distance_count += int(mask.sum())
+                dists[~mask] = np.inf
+                tree_labels[rows] = np.argmin(dists, axis=1)
+
+            # Other nodes pass their candidates on to both children.
+            descend = ~done & ~is_leaf
+            left = tree.left[nodes[descend]]
+            nodes = np.column_stack((left, left + 1)).ravel()
+            candidates = np.repeat(candidates[descend], 2, axis=0)
+
+        labels = np.empty_like(tree_labels)
+        labels[tree.order] = tree_labels
+        return labels
+
+
+class _ThreadedAssigner:
+    """
+    Runs an engine per contiguous chunk of the points on a thread pool and
+    concatenates the chunks' labels. Centroids are left to the caller:
+    summing per chunk and adding the partial sums would change the order
+    of the floating-point additions, and with it the result.
+    """
+
+    def __init__(self, points: np.ndarray, make_engine, pool, n_chunks: int):
+        bounds = np.linspace(0, len(points), min(n_chunks, len(points)) + 1)
+        bounds = bounds.astype(np.intp)
+        self.slices = [slice(a, b) for a, b in zip(bounds[:-1], bounds[1:])]
+        self.engines = [make_engine(points[chunk]) for chunk in self.slices]
+        self.pool = pool
+
+    @property
+    def distance_count(self) -> int:
+        return sum(engine.distance_count for engine in self.engines)
+
+    def __call__(self, means: np.ndarray) -> np.ndarray:
+        return np.concatenate(list(self.pool.map(
+            lambda engine: engine(means), self.engines
+        )))
+
+
+def _concatRanges(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Concatenation of np.arange(s, e) for every (s, e) pair."""
+    lengths = ends - starts
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return offsets + np.arange(int(lengths.sum()))
+
+
+def _arrayKey(arr: np.ndarray) -> tuple:
+    """Identify an array's memory and layout (views of one buffer share it)."""
+    return (arr.__array_interface__['data'][0], arr.shape, arr.strides,
+            arr.dtype.str)
+
+
+def _closestTwo(dists: np.ndarray) -> tuple:
+    """
+    Return the index of the smallest value in each row of `dists`, the value
+    itself, and the second smallest value (inf if there is only one column).
+    """
+    rows = np.arange(len(dists))
+    labels = np.argmin(dists, axis=1)
+    closest = dists[rows, labels]
+    if dists.shape[1] < 2:
+        return labels, closest, np.full(len(dists), np.inf)
+    masked = dists.copy()
+    masked[rows, labels] = np.inf
+    return labels, closest, masked.min(axis=1)
+
+
+def _closestMeans(points: np.ndarray, means: np.ndarray) -> tuple:
+    """
+    Label points as 'lloyd' does (from the same squared distances), and
+    return the (float64) distances to the closest and second closest means.
+    """
+    labels, closest, second = _closestTwo(
+        KMeans._pairwiseDistances(points, means)
+    )
+    return (labels, np.sqrt(closest, dtype=np.float64),
+            np.sqrt(second, dtype=np.float64))
+
+
+def _roundingSlack(points: np.ndarray) -> float:
+    """
+    Factor (just under 1) applied to lower bounds before they are compared
+    with upper bounds, so that a point is only skipped if its label is
+    certain despite the rounding error of distances computed in the points'
+    dtype (a few ulps per dimension).
+    """
+    tol = 4 * (points.shape[1] + 2) * np.finfo(points.dtype).eps
+    return (1 - tol) / (1 + tol)
+
+
+def _nearestOtherMean(means: np.ndarray) -> np.ndarray:
+    """Distance from each mean to the closest other mean (inf if k == 1)."""
+    centre_dists = np.sqrt(KMeans._pairwiseDistances(means, means))
+    np.fill_diagonal(centre_dists, np.inf)
+    return centre_dists.min(axis=1)
+
+
+ALGORITHMS = {
+    'lloyd': _LloydAssigner,
+    'hamerly': _HamerlyAssigner,
+    'elkan': _ElkanAssigner,
+    'kdtree': _KDTreeAssigner
+}
+
+
+# ==============
+# Initializers
+# ==============
+def check_random_state(seed) -> np.random.RandomState:
+    """
+    Turn `seed` into a np.random.RandomState.
+
+    `seed` may be None (fresh, unpredictable state), an integer, or an
+    existing RandomState (returned as-is).
+    """
+    if seed is None or isinstance(seed, (int, np.integer)):
+        return np.random.RandomState(seed)
+    if isinstance(seed, np.random.RandomState):
+        return seed
+    raise TypeError(f'Cannot seed a RandomState with {seed!r}.')
+
+
+def random_init(
+        points: np.ndarray,
+        k: int,
+        rng,
+        sample_weight: np.ndarray = None
+) -> np.ndarray:
+    """
+    Choose `k` distinct data points as the initial means.
+
+    Points are visited in a random order and duplicates are skipped, so
+    no rejection loop is needed. With `sample_weight`, the order is a
+    weighted random permutation (points of weight zero come last).
+    """
+    if sample_weight is None:
+        order = rng.permutation(len(points))
+    else:
+        # Efraimidis-Spirakis: sort by log(u) / w, largest first.
+        with np.errstate(divide='ignore'):
+            keys = np.log(rng.random_sample(len(points))) / sample_weight
+        order = np.argsort(-keys, kind='stable')
+    chosen, seen = [], set()
+    for index in order:
+        key = points[index].tobytes()
+        if key not in seen:
+            seen.add(key)
+            chosen.append(index)
+            if len(chosen) == k:
+                return points[chosen]
+    raise ValueError(
+        f"Cannot choose {k} initial means from {len(seen)} distinct points."
+    )
+
+
+def kmeanspp_init(
+        points: np.ndarray,
+        k: int,
+        rng,
+        n_local_trials: int = 1,
+        sample_weight: np.ndarray = None
+) -> np.ndarray:
+    """
+    Choose the initial means with k-means++ seeding.
+
+    Each new mean is sampled with probability proportional to its squared
+    distance from the closest mean chosen so far (times its weight, given
+    `sample_weight`). With `n_local_trials` above one, that many candidates
+    are sampled and the one that reduces the potential (sum of squared
+    distances) the most is kept.
+    """
+    n_points = len(points)
+    means = np.empty((k, points.shape[1]), dtype=points.dtype)
+    if sample_weight is None:
+        means[0] = points[rng.randint(n_points)]
+    else:
+        cumulative = np.cumsum(sample_weight)
+        first = np.searchsorted(
+            cumulative, rng.random_sample() * cumulative[-1], side='right'
+        )
+        means[0] = points[min(first, n_points - 1)]
+    closest = KMeans._pairwiseDistances(points, means[:1])[:, 0]
+    if sample_weight is not None:
+        closest = closest * sample_weight
+    potential = closest.sum(dtype=np.float64)
+
+    for c in range(1, k):
+        if potential <= 0:
+            raise ValueError(
+                f"Cannot choose {k} initial means; the data has only {c} "
+                "distinct points."
+            )
+        # Points with zero distance share a cumulative sum with their
+        # predecessor, so side='right' never selects them.
+        cumulative = np.cumsum(closest, dtype=np.float64)
+        targets = rng.random_sample(n_local_trials) * cumulative[-1]
+        candidates = np.minimum(
+            np.searchsorted(cumulative, targets, side='right'),
+            n_points - 1
+        )
+        candidate_dists = KMeans._pairwiseDistances(points, points[candidates])
+        if sample_weight is not None:
+            candidate_dists = candidate_dists * sample_weight[:, np.newaxis]
+        candidate_dists = np.minimum(closest[:, np.newaxis], candidate_dists)
+        potentials = candidate_dists.sum(axis=0, dtype=np.float64)
+        best = np.argmin(potentials)
+
+        means[c] = points[candidates[best]]
+        closest = candidate_dists[:, best]
+        potential = potentials[best]
+    return means
+
+
+def greedy_kmeanspp_init(
+        points: np.ndarray,
+        k: int,
+        rng,
+        sample_weight: np.ndarray = None
+) -> np.ndarray:
+    """k-means++ with 2 + ln(k) local trials per mean."""
+    return kmeanspp_init(points, k, rng, n_local_trials=2 + int(math.log(k)),
+                         sample_weight=sample_weight)
+
+
+INITIALIZERS = {
+    'random': random_init,
+    'k-means++': kmeanspp_init,
+    'greedy-k-means++': greedy_kmeanspp_init
+}
+# ---
@@ -7,12 +7,19 @@
 """
 
 from collections.abc import Iterable
-from typing import ClassVar
+from concurrent.futures import (
+    FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+)
+from pathlib import Path
+from typing import ClassVar, NamedTuple
 import copy
-import cv2 as cv
+import os
+import time
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.colors as mcolors
+from uav_follower.kmeans import (
+    INITIALIZERS, MiniBatchKMeans, check_random_state, cluster_unique,
+    iter_chunks, nearest_centroids, unique_rows
+)
 
 
 class KMeans:
@@ -46,6 +53,26 @@ class KMeans:
             iteration limit. All three parameters are adjustable via
             attribute assignment.
 
+        - Initialization:
+            Without `initial_means`, the starting means are chosen by
+            `init` ('random', 'k-means++', 'greedy-k-means++', or a callable
+            `init(points, k, rng) -> means`; see uav_follower.kmeans).
+            Pass `seed` for reproducible runs and timings.
+
+        - Mini-batch Clustering:
+            `cluster_minibatch` fits the centroids from random batches of
+            the data instead of iterating over every point, which is far
+            faster for image-sized data. To cluster more pixels than fit in
+            memory (ex. a directory of frames), pass the `image_chunks`
+            generator of this module to
+            uav_follower.kmeans.MiniBatchKMeans.fit directly.
+
+        - Clustering Distinct Colors:
+            An image usually has far fewer distinct colors than pixels.
+            `cluster_unique` clusters each distinct color once, weighted by
+            its pixel count (see uav_follower.kmeans.cluster_unique), and
+            returns clusters of distinct colors.
+
         - Segmenting Images:
             Once you've clustered an image's colorspace
             (if you're also using the Image class, there is a method
@@ -56,11 +83,35 @@ class KMeans:
             The method can segment images using random colors or use the
             centroids as the cluster colors.
 
-            *NOTE*:
-            Because the method has to iterate through every pixel of
-            every cluster, it can take a lot of time to run
-            (~0.056 s / pixel). At the time of writing, the author is
-            unaware of alternative methods.
+            The image is painted from a label image with a single palette
+            lookup, so a full frame takes milliseconds. Pass `labels` (one
+            per pixel) if you have them; otherwise each pixel is labeled by
+            the cluster containing its color.
+
+            For full-resolution frames, the module function
+            `segment_pyramid` clusters a downscaled copy first and refines
+            the centroids level by level, labeling the full frame only once.
+
+        - Batch Segmentation:
+            `segment_directory` (module function) segments a directory of
+            images across a process pool, writing label images and palettes
+            (or segmented images) as each one finishes and skipping images
+            that were already processed. See
+            helpful_scripts/segment_directory.py.
+
+        - Live Plotting:
+            With `cluster(display=True)`, at most `plot_points` points are
+            drawn (a stratified sample: each cluster gets its share of the
+            points, evenly spaced through the cluster). The scatter
+            artists are created once and updated in place, and the plot is
+            redrawn every `redraw_every` iterations (and on the last one),
+            pausing `pause` seconds for the GUI.
+
+        - Headless Use:
+            Matplotlib is imported, and the 2D/3D figures are created,
+            only when something is displayed (`cluster(display=True)`,
+            `openfig`). cv2 is imported only to read image files. Runs
+            with `display=False` need neither package.
 
         - (BONUS) Re-opening the figure(s):
             Accidentally closing a Matplotlib figure and not being able to
@@ -72,8 +123,11 @@ class KMeans:
     # Class Variables
     # =================
     _THRESH_MAX: ClassVar[int] = 1
-    colors: ClassVar[list] = [color for color in
-                              list(mcolors.TABLEAU_COLORS.values())]
+    # Matplotlib's TABLEAU_COLORS (listed to avoid importing matplotlib)
+    colors: ClassVar[list] = [
+        '#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd',
+        '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf'
+    ]
     WRAP_FACTOR: ClassVar[int] = len(colors)
 
     # =================
@@ -95,29 +149,52 @@ class KMeans:
             segments=2,
             initial_means=None,
             threshold=0.5,
-            maxIterations=100):
-            
+            maxIterations=100,
+            init='k-means++',
+            seed=None,
+            plot_points=2000,
+            redraw_every=1,
+            pause=0.05):
+
         self._data = data
         self._segments = segments
         self._threshold = threshold
         self._maxIterations = maxIterations
         self._initial_means = initial_means
+        self._init = init
+        self._rng = check_random_state(seed)
 
         self._validateParams()
 
-        # Plotting (2D and 3D cases)
-        self.figure2D = plt.figure()
-        self.axes2D = self.figure2D.add_subplot()
-        self.figure3D = plt.figure()
-        self.axes3D = self.figure3D.add_subplot(projection='3d')
-        # Close unused figure(s)
-        self.closefig()
+        # Plotting (2D and 3D cases); figures are created on first display.
+        self._figures = {}
+        self.plot_points = plot_points
+        self.redraw_every = redraw_every
+        self.pause = pause
+        # Scatter artists per figure, updated in place by _display
+        self._artists = {}
         # plt.ion()
 
     # ============
     # Properties
     # ============
     '''Use these instead of explicit getters and setters'''
+    @property
+    def figure2D(self):
+        return self._figure('2d')[0]
+
+    @property
+    def axes2D(self):
+        return self._figure('2d')[1]
+
+    @property
+    def figure3D(self):
+        return self._figure('3d')[0]
+
+    @property
+    def axes3D(self):
+        return self._figure('3d')[1]
+
     @property
     def data(self):
         """Returns a copy of the object's data"""
@@ -195,9 +272,6 @@ class KMeans:
         K_NUM = self.segments
         THRESH = self.threshold
 
-        if not display:
-            plt.close(self.figure2D)
-            plt.close(self.figure3D)
         # Check (preclude inf. loop)
         # If the length of the data is less than the target segment number,
         # getting the initial means will result in an infinite loop.
@@ -223,24 +297,10 @@ class KMeans:
         if self._initial_means is not None:
             means = self._initial_means
         else:
-            # get k random points to serve as initial means
-            print("Generating initial means...")
-            means_found = False
-
-            # Loop until the mean points are found. It shouldn't loop at
-            # all since repeat points are unlikely, but with randomization,
-            # there's always a chance, so I placed the check for uniqueness.
-            while not means_found:
-                means = np.array([data[np.random.randint(0, len(data))]
-                                  for _ in range(K_NUM)])
-                # Sanity Check
-                length = len(means)
-                assert length == K_NUM
-                # Ensure no duplicate point
-                check = np.unique(means, axis=0)
-                if len(check) == length:
-                    means_found = True
-                    print(means)
+            init = self._init
+            if isinstance(init, str):
+                init = INITIALIZERS[init]
+            means = init(np.array(data, dtype=np.float64), K_NUM, self._rng)
         # print(f'Means Check:\n{means}')
         # Begin loop; Currently, the program will loop until each calculated
         # cluster centroid is within THRESH distance from the mean found in the
@@ -264,9 +324,6 @@ class KMeans:
             # print(f'Clusters: {clusters}')
             centroids = self._findCentroid(clusters)
             # print(f'Centroids: {centroids}')
-            # Live plot the data
-            if display:
-                self._display([clusters, centroids, iterations])
 
             # Compare centroids to previous means.
             for i in range(len(centroids)):
@@ -277,13 +334,95 @@ class KMeans:
                     break
             else:
                 thresh_reached = True
+
+            # Live plot the data (always show the final iteration)
+            if display and (thresh_reached
+                            or iterations % self.redraw_every == 0):
+                self._display([clusters, centroids, iterations])
         if iterations < self._maxIterations:
             print("Successful cluster operation.\n")
         return [clusters, centroids, iterations]
 
+    def cluster_minibatch(self, batch_size: int = 1024) -> list:
+        """
+        Cluster the data with mini-batch k-Means (see
+        uav_follower.kmeans.MiniBatchKMeans). Each point is then labeled
+        with its nearest centroid once.
+
+        Parameters
+        ----------
+        batch_size : int, optional
+            Points per mini-batch. The default is 1024.
+
+        Returns
+        -------
+        list
+            - Clusters: dict
+            - Centroids: np.ndarray
+            - IterationCount: int (mini-batches processed)
+        """
+        data = np.asarray(self._data)
+        K_NUM = self.segments
+        means = self._initial_means
+        minibatch = MiniBatchKMeans(
+            K_NUM,
+            batch_size=batch_size,
+            init=self._init if means is None else np.asarray(means),
+            seed=self._rng,
+            threshold=self.threshold,
+            maxIterations=self.maxIterations
+        ).fit(data)
+        centroids = minibatch.centroids
+
+        # Label in chunks to bound the size of the distance matrix.
+        labels = np.concatenate([
+            np.argmin(
+                ((chunk[:, np.newaxis, :] - centroids[np.newaxis, :, :])**2)
+                .sum(axis=2),
+                axis=1
+            )
+            for chunk in iter_chunks(data.astype(np.float64), 2**16)
+        ])
+        clusters = {k: data[labels == k] for k in range(K_NUM)}
+        return [clusters, centroids, minibatch.iterations]
+
+    def cluster_unique(self) -> list:
+        """
+        Cluster the distinct rows of the data, each weighted by how often it
+        occurs. Gives the same centroids as clustering every row, with the
+        work cut by the duplication factor.
+
+        Returns
+        -------
+        list
+            - Clusters: dict (distinct rows only)
+            - Centroids: np.ndarray
+            - IterationCount: int
+        """
+        data = np.asarray(self._data)
+        means = self._initial_means
+        result = cluster_unique(
+            data,
+            segments=self.segments,
+            init=self._init if means is None else np.asarray(means),
+            seed=self._rng,
+            threshold=self.threshold,
+            maxIterations=self.maxIterations,
+            dtype=np.float64
+        )
+        # Each distinct row once, with the label of its occurrences.
+        unique, inverse, _ = unique_rows(data)
+        unique_labels = np.empty(len(unique), dtype=np.intp)
+        unique_labels[inverse] = result.labels
+        clusters = {
+            k: unique[unique_labels == k] for k in range(self.segments)
+        }
+        return [clusters, result.centroids, result.iterations]
+
     @staticmethod
     def segment_img(image: np.ndarray, clusters: dict, centroids: list,
-                    random_colors: bool = False) -> np.ndarray:
+                    random_colors: bool = False,
+                    labels: np.ndarray = None) -> np.ndarray:
         """
         Perform image segmentation from k-Means clustering
 
@@ -295,70 +434,56 @@ class KMeans:
         random_colors : bool, optional
             Whether to use the centroids as colors, or generate random ones.
             The default is False.
+        labels : np.ndarray, optional
+            Cluster label of each pixel (row-major). If not given, pixels are
+            labeled by the cluster that contains their color; colors in no
+            cluster take the closest centroid.
         Returns
         -------
         seg_img : np.ndarray
             The segmented image. (RGB)
 
         """
-        # Setup: Copy the image and get the colors;
-        # Do I want to check for repeat colors?
-        # The chance of that happening is so miniscule.
-        print(f'Beginning Image Segmentation: {len(clusters)} segments.')
-        seg_img = np.copy(image)
+        height, width, channels = image.shape
+        segments = len(centroids)
+        # Palette computed once: one color per cluster.
         if random_colors:
-            colors = [(np.random.randint(0, 256),
-                      np.random.randint(0, 256),
-                      np.random.randint(0, 256)) for _ in range(len(clusters))]
+            palette = np.random.randint(0, 256, size=(segments, channels))
         else:
             # Use centroid color
-            colors = np.round(centroids, 0)
-
-        # Inspiration (and much gratitude):
-        # https://stackoverflow.com/questions/16094563/numpy-get-index-where-value-is-true
-        # Use Numpy nonzero function to find the indices of all elements that
-        # match a given pixel in a cluster.
-        # Use those indices to replace the pixel values
-        # therein with the segmentation color.
-
-        '''
-        Iterating through a given cluster takes the most time.
-        Can I make this faster?
-        '''
-        seg_img = seg_img.reshape(-1, 3)
-        # Prepare percentage calculation variables
-        total_cnt = 0
-        for key in clusters:
-            total_cnt += len(clusters[key])
-
-        print(total_cnt)
-
-        count = 0
-        print('Segmentation Completion (%)')
-        old_percent = -1
-        for cluster in clusters:
-            # Remember that the keys in the dictionary range from
-            # 0 to k-1, so they also
-            # double as indices.
-            seg_color = colors[cluster]
-            for pixel in clusters[cluster]:
-                # Get indices where image is equal to pixel
-                # print(f'Pixel: {type(pixel)}')
-                indices = np.nonzero(np.all(np.equal(pixel, seg_img), axis=1))
-                # print(indices[0])
-                seg_img[indices[0]] = seg_color
-                count += 1
-
-                # Print progress
-                percentage = round((count / total_cnt) * 100, ndigits=2)
-                if percentage % 5 == 0 and percentage != old_percent:
-                    print(percentage, end=' ')
-                    old_percent = percentage
-        else:
-            # Please include the 'else' statement to prevent a tremendous
-            # debugging headache. Watch the indentation.
-            seg_img = seg_img.reshape(image.shape)
-        return seg_img
+            palette = np.round(np.asarray(centroids, dtype=np.float64))
+        if np.issubdtype(image.dtype, np.integer):
+            info = np.iinfo(image.dtype)
+            palette = np.clip(palette, info.min, info.max)
+        palette = palette.astype(image.dtype)
+
+        if labels is None:
+            labels = KMeans._pixelLabels(
+                image.reshape(-1, channels), clusters, centroids
+            )
+        return palette[np.asarray(labels).reshape(height, width)]
+
+    @staticmethod
+    def _pixelLabels(pixels: np.ndarray, clusters: dict,
+                     centroids: list) -> np.ndarray:
+        """Label each pixel with the cluster whose points include its color."""
+        members = [np.asarray(clusters[k], dtype=pixels.dtype)
+                   .reshape(-1, pixels.shape[1]) for k in range(len(clusters))]
+        member_labels = np.repeat(
+            np.arange(len(members)), [len(rows) for rows in members]
+        )
+        # Label every distinct color of the clusters and the image at once.
+        unique, inverse, _ = unique_rows(np.concatenate(members + [pixels]))
+        color_labels = np.full(len(unique), -1, dtype=np.intp)
+        color_labels[inverse[:len(member_labels)]] = member_labels
+        labels = color_labels[inverse[len(member_labels):]]
+
+        missing = labels < 0
+        if missing.any():
+            labels[missing] = nearest_centroids(
+                pixels[missing], np.asarray(centroids), dtype=np.float64
+            )
+        return labels
 
     def closefig(self, close_all=False):
         """
@@ -368,22 +493,18 @@ class KMeans:
         close_all: bool
             Close all (both) plots. Defaults to False.
         """
+        # Nothing to close if nothing was displayed.
+        if not self._figures:
+            return
+        plt = _pyplot()
         # Close unused plot
         # Intention: Get the number of dimensions of the data
         # (Ex. [(0,0,0)]) has dimension 3 for the data.
         data_dim = np.array(self._data).shape[-1]
-        # print(f"VALIDATE DATA: {data_dim}")
-        if close_all:
-            plt.close(fig=self.figure2D)
-            plt.close(fig=self.figure3D)
-        elif data_dim == 2:
-            plt.close(fig=self.figure3D)
-        elif data_dim == 3:
-            plt.close(fig=self.figure2D)
-        else:
-            # Close both
-            plt.close(fig=self.figure2D)
-            plt.close(fig=self.figure3D)
+        used = None if close_all else {2: '2d', 3: '3d'}.get(data_dim)
+        for which, (fig, _) in self._figures.items():
+            if which != used:
+                plt.close(fig=fig)
 
     def openfig(self, which_dimension: str):
         """
@@ -397,6 +518,7 @@ class KMeans:
         """
         # Credit: https://stackoverflow.com/questions/31729948/matplotlib-how-to-show-a-figure-that-has-been-closed  #noqa
         dim_string = which_dimension.lower()
+        plt = _pyplot()
 
         if dim_string == '2d':
             blank = plt.figure()
@@ -416,6 +538,18 @@ class KMeans:
             return
 
     # ::Private methods::
+    def _figure(self, which: str) -> tuple:
+        """The ('2d' or '3d') figure and its axes, created on first use."""
+        if which not in self._figures:
+            plt = _pyplot()
+            figure = plt.figure()
+            if which == '3d':
+                axes = figure.add_subplot(projection='3d')
+            else:
+                axes = figure.add_subplot()
+            self._figures[which] = (figure, axes)
+        return self._figures[which]
+
     def _validateParams(self):
         """Helps consolidate edge-case checks."""
         # access and validate the data
@@ -440,6 +574,9 @@ class KMeans:
             raise ValueError("Cannot have a negative threshold value.")
         if MAX_ITERATIONS <= 0:
             raise ValueError("Must have at least one iteration.")
+        if not (callable(self._init) or self._init in INITIALIZERS):
+            raise ValueError("Initializer must be callable or one of the "
+                             f"following:\n{list(INITIALIZERS)}")
 
         if initial_means is not None:
             if type(initial_means) not in accepted_types:
@@ -585,7 +722,10 @@ class KMeans:
         return centroids
 
     def _display(self, data: Iterable):
-        ...
+        """
+        Draw one iteration: a stratified sample of each cluster's points
+        and the centroids, updating the existing artists in place.
+        """
         # Assume we are passed the clusters, centroids, and iterations count
         # TO-DO: Figure out how to get the centroid to show in a 3D cluster.
 
@@ -599,55 +739,411 @@ class KMeans:
         10 % 10 == 0 (Remember 0-based indexing).
         """
 
-        colors = KMeans.colors
-        WRAP_FACTOR = KMeans.WRAP_FACTOR
-
         # Get data
         clusters, centroids, iterations = data
-        # print(clusters[0][0])
-        dimensions = len(clusters[0][0])
-        # print(f'Data Dimensions: {dimensions}')
-        labels = ['Cluster {}'.format(i) for i in range(len(clusters))]
-
-        # 2D case
+        dimensions = np.shape(self._data)[-1]
         if dimensions == 2:
-            # plt.close(fig=self.figure3D)
-            ax = self.axes2D
-            ax.clear()
-            ax.set(xlabel='x', ylabel='y',
-                   title='k-Means Iteration {}\nk = {}'.format(iterations,
-                                                               self._segments))
-            for i in range(len(clusters)):
-                x, y = zip(*clusters[i])
-                cenX, cenY = centroids[i]
-                ax.scatter(x, y, s=10, color=colors[i % WRAP_FACTOR],
-                           label=labels[i])
-                ax.scatter(cenX, cenY, color=colors[i % WRAP_FACTOR],
-                           marker='o', s=50, zorder=3, edgecolor='k')
-            # ax.legend()
-            # ax.grid(visible=True, axis='both')
-            plt.pause(0.05)
-
-        # 3D case
+            which, axis_labels = '2d', dict(xlabel='x', ylabel='y')
         elif dimensions == 3:
-            # plt.close(fig=self.figure2D)
-            ax = self.axes3D
-            ax.clear()
-
-            # Plot setup
-            ax.set(xlabel='R', ylabel='G', zlabel='B',
-                   title='k-Means Iteration {}\nk = {}'.format(iterations,
-                                                               self._segments))
-            # Get R, G, B points and plot them for each cluster
-            # Matplotlib automatically switches color for each call to scatter.
-            for i in range(len(clusters)):
-                R, G, B = zip(*clusters[i])
-                # cenR, cenG, cenB = centroids[i]
-                ax.scatter(R, G, B, s=10, color=colors[i % WRAP_FACTOR])
-                # ax.scatter(cenR, cenG, cenB ,marker='*', s=(72*2), zorder=5)
-            plt.pause(0.05)
-        # plt.show()
+            which, axis_labels = '3d', dict(xlabel='R', ylabel='G', zlabel='B')
         else:
             # print("Data is neither 2D nor 3D. Returning.")
             return
+
+        plt = _pyplot()
+        figure, ax = self._figure(which)
+        artists = self._artists.get(which)
+        if artists is None or len(artists[0]) != len(clusters):
+            artists = self._artists[which] = self._createArtists(
+                ax, len(clusters), dimensions, axis_labels
+            )
+        point_artists, centroid_artists = artists
+
+        for artist, points in zip(point_artists,
+                                  self._samplePoints(clusters, dimensions)):
+            self._setPoints(artist, points)
+        for artist, centroid in zip(centroid_artists, centroids):
+            self._setPoints(artist, np.reshape(centroid, (1, -1)))
+        ax.set_title('k-Means Iteration {}\nk = {}'.format(iterations,
+                                                            self._segments))
+        figure.canvas.draw_idle()
+        plt.pause(self.pause)
+
+    def _createArtists(self, ax, segments: int, dimensions: int,
+                       axis_labels: dict) -> tuple:
+        """Empty scatter artists for each cluster's points and centroid."""
+        colors = KMeans.colors
+        WRAP_FACTOR = KMeans.WRAP_FACTOR
+        ax.clear()
+        ax.set(**axis_labels)
+        empty = [[]] * dimensions
+        point_artists = [
+            ax.scatter(*empty, s=10, color=colors[i % WRAP_FACTOR],
+                       label='Cluster {}'.format(i))
+            for i in range(segments)
+        ]
+        centroid_artists = [
+            ax.scatter(*empty, marker='o', s=50, zorder=3, edgecolor='k',
+                       color=colors[i % WRAP_FACTOR])
+            for i in range(segments)
+        ]
+        # Fixed limits: in-place updates do not rescale the axes.
+        data = np.asarray(self._data, dtype=np.float64)
+        lows, highs = data.min(axis=0), data.max(axis=0)
+        margins = 0.05 * np.maximum(highs - lows, 1e-9)
+        setters = [ax.set_xlim, ax.set_ylim]
+        if dimensions == 3:
+            setters.append(ax.set_zlim)
+        for setter, low, high, margin in zip(setters, lows, highs, margins):
+            setter(low - margin, high + margin)
+        # ax.legend()
+        # ax.grid(visible=True, axis='both')
+        return point_artists, centroid_artists
+
+    def _samplePoints(self, clusters: dict, dimensions: int) -> list:
+        """
+        At most `plot_points` points in total, each cluster contributing in
+        proportion to its size (at least one point if it has any), taken
+        evenly spaced through the cluster.
+        """
+        sizes = np.array([len(clusters[i]) for i in range(len(clusters))])
+        total = max(int(sizes.sum()), 1)
+        samples = []
+        for i, size in enumerate(sizes):
+            share = min(size, max(1, int(self.plot_points * size / total)))
+            if not size:
+                samples.append(np.empty((0, dimensions)))
+                continue
+            picks = np.linspace(0, size - 1, share).astype(np.intp)
+            samples.append(np.asarray([clusters[i][j] for j in picks],
+                                      dtype=np.float64))
+        return samples
+
+    @staticmethod
+    def _setPoints(artist, points: np.ndarray):
+        """Move a 2D or 3D scatter artist to new (n, 2|3) points."""
+        points = np.asarray(points, dtype=np.float64).reshape(len(points), -1)
+        if points.shape[1] == 3:
+            artist._offsets3d = (points[:, 0], points[:, 1], points[:, 2])
+        else:
+            artist.set_offsets(points)
+
+
+def _pyplot():
+    """Import matplotlib.pyplot on first use; plotting is optional."""
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def image_pyramid(image: np.ndarray, levels: int) -> list:
+    """
+    Return [image, image / 2, image / 4, ...] (`levels` images in all),
+    each level the 2 x 2 block average of the previous one (odd rows and
+    columns are dropped). Levels are float32.
+    """
+    pyramid = [np.asarray(image, dtype=np.float32)]
+    for _ in range(levels - 1):
+        prev = pyramid[-1]
+        height, width = prev.shape[0] // 2, prev.shape[1] // 2
+        if not (height and width):
+            break
+        blocks = prev[:2 * height, :2 * width].reshape(
+            height, 2, width, 2, -1
+        )
+        pyramid.append(blocks.mean(axis=(1, 3)))
+    return pyramid
+
+
+def segment_pyramid(
+        image: np.ndarray,
+        segments: int,
+        *,
+        levels: int = 3,
+        init='k-means++',
+        seed=None,
+        threshold: float = 0.5,
+        maxIterations: int = 100,
+        random_colors: bool = False
+) -> list:
+    """
+    Coarse-to-fine image segmentation.
+
+    The coarsest level of the image pyramid (see `image_pyramid`) is
+    clustered from `init`. Each finer level, except the full-resolution
+    image, is clustered starting from the previous level's centroids, which
+    takes few iterations. The full-resolution pixels are only labeled with
+    the final centroids (one assignment pass), then painted with
+    KMeans.segment_img.
+
+    Parameters
+    ----------
+    image : np.ndarray
+        (H, W, C) image (RGB).
+    segments : int
+        Number of clusters.
+    levels : int, optional
+        Pyramid levels, including the full-resolution image. With 1, the
+        full image is clustered directly.
+    init, seed, threshold, maxIterations : optional
+        See uav_follower.kmeans.KMeans (the threshold is in color units).
+    random_colors : bool, optional
+        See KMeans.segment_img.
+
+    Returns
+    -------
+    list
+        - Segmented image: np.ndarray (RGB)
+        - Labels: np.ndarray (H, W)
+        - Centroids: np.ndarray
+        - IterationCounts: list (coarsest level first)
+    """
+    channels = image.shape[-1]
+    pyramid = image_pyramid(image, levels)
+    coarse = pyramid[1:] if len(pyramid) > 1 else pyramid
+    rng = check_random_state(seed)
+
+    # Distinct colors only: block averages of flat regions repeat a lot.
+    centroids, iterations = init, []
+    for level in reversed(coarse):
+        result = cluster_unique(
+            level.reshape(-1, channels),
+            segments=segments,
+            init=centroids,
+            seed=rng,
+            threshold=threshold,
+            maxIterations=maxIterations,
+            dtype=np.float32
+        )
+        centroids = result.centroids
+        iterations.append(result.iterations)
+
+    labels = nearest_centroids(image.reshape(-1, channels), centroids)
+    labels = labels.reshape(image.shape[:2])
+    segmented = KMeans.segment_img(
+        image, None, centroids, random_colors=random_colors, labels=labels
+    )
+    return [segmented, labels, centroids, iterations]
+
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp'}
+
+
+def image_chunks(sources, chunk_size: int = None):
+    """
+    Yield the RGB pixels of a series of images as (n, 3) chunks.
+
+    Parameters
+    ----------
+    sources : Iterable
+        Image arrays (RGB) and/or paths. A path may be an image file or a
+        directory, in which case every image file in it is used (sorted by
+        name). Files are read one at a time.
+    chunk_size : int, optional
+        Maximum rows per chunk. By default, each image is one chunk.
+    """
+    if isinstance(sources, (str, Path, np.ndarray)):
+        sources = [sources]
+    for source in sources:
+        if isinstance(source, np.ndarray):
+            images = [source]
+        else:
+            path = Path(source)
+            if path.is_dir():
+                images = (p for p in sorted(path.iterdir())
+                          if p.suffix.lower() in IMAGE_EXTENSIONS)
+            else:
+                images = [path]
+        for image in images:
+            if not isinstance(image, np.ndarray):
+                import cv2 as cv
+                image = cv.imread(str(image))
+                if image is None:
+                    continue
+                image = image[..., ::-1]  # BGR -> RGB
+            pixels = image.reshape(-1, image.shape[-1])
+            if chunk_size is None:
+                yield pixels
+            else:
+                yield from iter_chunks(pixels, chunk_size)
+
+
+class SegmentRecord(NamedTuple):
+    """One image segmented by `segment_directory`."""
+    source: Path
+    outputs: tuple    # files written (empty if the image was skipped)
+    worker: int       # process ID of the worker (0 if skipped)
+    seconds: float    # time spent reading, clustering, and writing
+    pixels: int
+    iterations: int   # clustering iterations (summed over pyramid levels)
+
+
+SEGMENT_OUTPUTS = ('labels', 'segmented')
+
+
+def segment_outputs(source, output_dir, output: str = 'labels') -> tuple:
+    """
+    Files `segment_directory` writes for image `source`:
+        'labels': <stem>_labels.png (cluster index per pixel, uint8) and
+            <stem>_palette.npy (the (K, 3) RGB centroids).
+        'segmented': <stem>_segmented.png (each pixel painted with its
+            centroid color).
+    """
+    stem = Path(source).stem
+    output_dir = Path(output_dir)
+    if output == 'labels':
+        return (output_dir / f'{stem}_labels.png',
+                output_dir / f'{stem}_palette.npy')
+    if output == 'segmented':
+        return (output_dir / f'{stem}_segmented.png',)
+    raise ValueError(
+        f"Unknown output '{output}'. Options: {', '.join(SEGMENT_OUTPUTS)}."
+    )
+
+
+def segment_file(source, output_dir, *, segments: int, output='labels',
+                 levels: int = 1, **kwargs) -> SegmentRecord:
+    """
+    Segment one image file and write its outputs (see `segment_outputs`).
+
+    With `levels` == 1, the image is clustered with
+    uav_follower.kmeans.cluster_unique; with more levels, with
+    `segment_pyramid`. Other keyword arguments go to the KMeans constructor
+    (`init`, `seed`, `threshold`, `maxIterations`).
+    Each output is written under a temporary name and then renamed, so an
+    interrupted run never leaves a file that looks finished.
+    """
+    import cv2 as cv
+
+    start = time.perf_counter()
+    paths = segment_outputs(source, output_dir, output)
+    image = cv.imread(str(source))
+    if image is None:
+        raise IOError(f'Could not read image {source}.')
+    image = image[..., ::-1]  # BGR -> RGB
+
+    if levels > 1:
+        segmented, labels, centroids, iterations = segment_pyramid(
+            image, segments, levels=levels, **kwargs
+        )
+        iterations = sum(iterations)
+    else:
+        # cluster_unique labels every pixel already; no need to rebuild
+        # the labels from clusters of distinct colors.
+        result = cluster_unique(
+            image.reshape(-1, image.shape[-1]),
+            segments=segments,
+            dtype=np.float32,
+            **kwargs
+        )
+        centroids, iterations = result.centroids, result.iterations
+        labels = result.labels.reshape(image.shape[:2])
+        segmented = KMeans.segment_img(image, None, centroids, labels=labels)
+
+    if output == 'labels':
+        if segments > 256:
+            raise ValueError('Label images hold at most 256 segments.')
+        _writeAtomic(
+            paths[0], lambda tmp: cv.imwrite(str(tmp), labels.astype(np.uint8))
+        )
+        _writeAtomic(
+            paths[1], lambda tmp: np.save(tmp, np.asarray(centroids))
+        )
+    else:
+        _writeAtomic(
+            paths[0], lambda tmp: cv.imwrite(str(tmp), segmented[..., ::-1])
+        )
+    return SegmentRecord(
+        source=Path(source),
+        outputs=paths,
+        worker=os.getpid(),
+        seconds=time.perf_counter() - start,
+        pixels=image.shape[0] * image.shape[1],
+        iterations=int(iterations)
+    )
+
+
+def _writeAtomic(path: Path, write):
+    """Call write(tmp) for a hidden temporary path, then rename it to path."""
+    # Keep the suffix: cv2 and np.save pick the format from it.
+    tmp = path.with_name(f'.{path.stem}.tmp{path.suffix}')
+    if write(tmp) is False:
+        raise IOError(f'Could not write {path}.')
+    os.replace(str(tmp), str(path))
+
+
+def segment_directory(source, output_dir, *, segments: int,
+                      output: str = 'labels', processes: int = None,
+                      skip_existing: bool = True, **kwargs):
+    """
+    Segment every image in directory `source` across a process pool,
+    yielding a SegmentRecord per image as it finishes.
+
+    Files are listed lazily and at most two per process are in flight, so
+    memory use does not grow with the directory. Images whose outputs all
+    exist already (see `segment_outputs`) are skipped with
+    `skip_existing`; their records have no outputs. Keyword arguments are
+    those of `segment_file`.
+
+    Parameters
+    ----------
+    source : str | Path
+        Directory of images (ex. from savebackground.py or
+        codrone_dataset_gen.py).
+    output_dir : str | Path
+        Directory for the outputs. Created if it doesn't exist.
+    segments : int
+        Number of clusters per image.
+    output : str, optional
+        'labels' (label image + palette) or 'segmented'.
+    processes : int, optional
+        Worker processes. Defaults to the number of CPUs.
+    skip_existing : bool, optional
+        Whether to skip images that were already processed.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    segment_outputs('', output_dir, output)  # validate early
+    images = (p for p in sorted(Path(source).iterdir())
+              if p.suffix.lower() in IMAGE_EXTENSIONS)
+    processes = processes or os.cpu_count() or 1
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        pending = set()
+        for image in images:
+            paths = segment_outputs(image, output_dir, output)
+            if skip_existing and all(p.exists() for p in paths):
+                yield SegmentRecord(image, (), 0, 0.0, 0, 0)
+                continue
+            pending.add(executor.submit(
+                segment_file, image, output_dir, segments=segments,
+                output=output, **kwargs
+            ))
+            if len(pending) >= 2 * processes:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in as_completed(pending):
+            yield future.result()
+
+
+def worker_throughput(records: Iterable) -> dict:
+    """
+    Summarize SegmentRecords per worker process (skipped images excluded):
+    {pid: {'images', 'pixels', 'seconds', 'images_per_s', 'mpixels_per_s'}}
+    """
+    stats = {}
+    for record in records:
+        if not record.outputs:
+            continue
+        entry = stats.setdefault(
+            record.worker, {'images': 0, 'pixels': 0, 'seconds': 0.0}
+        )
+        entry['images'] += 1
+        entry['pixels'] += record.pixels
+        entry['seconds'] += record.seconds
+    for entry in stats.values():
+        seconds = entry['seconds'] or float('inf')
+        entry['images_per_s'] = entry['images'] / seconds
+        entry['mpixels_per_s'] = entry['pixels'] / seconds / 1e6
+    return stats
 # ---